@@ -4,16 +4,26 @@ Options Trading Platform - Main Flask Application
 A comprehensive options trading platform with Black-Scholes pricing,
 delta hedging, and P&L tracking for market makers.
 """
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for
 from flask_cors import CORS
 from datetime import datetime, date
+import hashlib
+import threading
+import time
+import numpy as np
+import msgspec
 import config
+import schemas
 from data.database import db, init_db, Position, get_portfolio_summary
 from data.market_data import MarketDataManager
-from models.black_scholes import black_scholes_price, calculate_delta, implied_volatility
-from models.greeks import calculate_all_greeks, risk_report
+from models.black_scholes import (black_scholes_price, calculate_delta, implied_volatility,
+                                  implied_volatility_batch, bs_greeks_vec)
+from models.greeks import calculate_all_greeks, clear_greeks_cache, risk_report
 from models.portfolio import Portfolio
+from utils.cache import CachedMarketData
 from utils.hedging import DeltaHedger
+from utils.json import dumps_bytes, jsonify_fast
+from utils.market_batch import fetch_symbol_context, prefetch_open_position_prices
 from utils.pnl import PnLTracker
 
 # Initialize Flask app
@@ -21,15 +31,19 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = config.SECRET_KEY
 app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connections are shared across concurrent green/threaded workers
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
 
 # Initialize extensions
 CORS(app)
 
 # Initialize services
-market_data = MarketDataManager(
+# The TTL cache layer turns repeated quote/rate lookups within the cache
+# window into dict reads instead of network round-trips
+market_data = CachedMarketData(MarketDataManager(
     alpha_vantage_key=config.ALPHA_VANTAGE_API_KEY,
     use_yfinance=True
-)
+))
 portfolio = Portfolio(market_data)
 hedger = DeltaHedger(market_data)
 pnl_tracker = PnLTracker(market_data)
@@ -38,6 +52,28 @@ pnl_tracker = PnLTracker(market_data)
 init_db(app)
 
 
+def _refresh_hot_symbols():
+    """
+    Keep quotes warm for every symbol with an open position.
+
+    Runs on a daemon thread, re-fetching the held symbols once per
+    cache window so API requests are served from cache instead of
+    paying external-API latency.
+    """
+    while True:
+        time.sleep(config.MARKET_DATA_CACHE_SECONDS)
+        try:
+            with app.app_context():
+                prefetch_open_position_prices(market_data)
+        except Exception as e:
+            print(f"Error refreshing market data cache: {e}")
+
+
+if config.MARKET_DATA_BACKGROUND_REFRESH:
+    threading.Thread(target=_refresh_hot_symbols, daemon=True,
+                     name='market-data-refresh').start()
+
+
 @app.route('/')
 def index():
     """Main dashboard"""
@@ -60,53 +96,51 @@ def price_option():
     }
     """
     try:
-        data = request.json
+        req = schemas.decode(request.get_data(), schemas.PriceOptionReq)
 
-        # Fetch current market price
-        stock_data = market_data.get_stock_price(data['symbol'])
+        # Fetch price, volatility, and rate concurrently
+        stock_data, hist_vol, risk_free_rate = fetch_symbol_context(
+            market_data, req.symbol, need_volatility=req.implied_vol is None)
         current_price = stock_data['price']
 
-        # Get risk-free rate
-        risk_free_rate = market_data.get_risk_free_rate()
-
         # Calculate time to expiration
-        T = data['days_to_expiry'] / 365.0
+        T = req.days_to_expiry / 365.0
 
         # If IV not provided, use historical volatility
-        sigma = data.get('implied_vol')
+        sigma = req.implied_vol
         if sigma is None:
-            sigma = market_data.get_historical_volatility(data['symbol'])
+            sigma = hist_vol
 
         # Calculate option price
         option_price = black_scholes_price(
             S=current_price,
-            K=data['strike'],
+            K=req.strike,
             T=T,
             r=risk_free_rate,
             sigma=sigma,
-            option_type=data['option_type'],
-            q=data.get('dividend_yield', 0)
+            option_type=req.option_type,
+            q=req.dividend_yield
         )
 
         # Calculate Greeks
         greeks = calculate_all_greeks(
             S=current_price,
-            K=data['strike'],
+            K=req.strike,
             T=T,
             r=risk_free_rate,
             sigma=sigma,
-            option_type=data['option_type'],
-            q=data.get('dividend_yield', 0)
+            option_type=req.option_type,
+            q=req.dividend_yield
         )
 
         # Calculate hedge requirements
-        num_contracts = data.get('num_contracts', 1)
+        num_contracts = req.num_contracts
         position_delta = greeks['delta'] * num_contracts * config.OPTIONS_MULTIPLIER
         hedge_shares = -position_delta  # Negative to offset
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
-            'symbol': data['symbol'],
+            'symbol': req.symbol,
             'current_price': current_price,
             'option_price': round(option_price, 2),
             'total_premium': round(option_price * num_contracts * config.OPTIONS_MULTIPLIER, 2),
@@ -124,7 +158,85 @@ def price_option():
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/price-options-batch', methods=['POST'])
+def price_options_batch():
+    """
+    Price a batch of options (e.g. a whole chain) in one request.
+
+    Market data is fetched once and all prices/Greeks are computed in a
+    single vectorized pass, so per-option cost is a NumPy operation
+    instead of a full request round-trip.
+
+    Expected JSON:
+    {
+        "symbol": "AAPL",
+        "strikes": [140, 145, 150],
+        "days": [30, 30, 30],
+        "types": ["call", "call", "put"],
+        "implied_vol": 0.25,
+        "dividend_yield": 0.0
+    }
+    """
+    try:
+        req = schemas.decode(request.get_data(), schemas.PriceOptionsBatchReq)
+
+        strikes = np.asarray(req.strikes, dtype=np.float64)
+        days = np.asarray(req.days, dtype=np.float64)
+        is_call = np.asarray([t == 'call' for t in req.types], dtype=bool)
+
+        if not (len(strikes) == len(days) == len(is_call)):
+            raise ValueError("strikes, days and types must have the same length")
+
+        # Fetch market data once for the whole batch
+        stock_data = market_data.get_stock_price(req.symbol)
+        current_price = stock_data['price']
+        risk_free_rate = market_data.get_risk_free_rate()
+
+        sigma = req.implied_vol
+        if sigma is None:
+            sigma = market_data.get_historical_volatility(req.symbol)
+
+        results = bs_greeks_vec(
+            S=current_price,
+            K=strikes,
+            T=days / 365.0,
+            r=risk_free_rate,
+            sigma=sigma,
+            q=req.dividend_yield,
+            is_call=is_call
+        )
+
+        options = [
+            {
+                'strike': strikes[i],
+                'days_to_expiry': days[i],
+                'option_type': req.types[i],
+                'option_price': round(results['price'][i], 2),
+                'greeks': {
+                    'delta': round(results['delta'][i], 4),
+                    'gamma': round(results['gamma'][i], 4),
+                    'vega': round(results['vega'][i], 4),
+                    'theta': round(results['theta'][i], 4),
+                    'rho': round(results['rho'][i], 4)
+                }
+            }
+            for i in range(len(strikes))
+        ]
+
+        return jsonify_fast({
+            'success': True,
+            'symbol': req.symbol,
+            'current_price': current_price,
+            'implied_vol': round(sigma, 4),
+            'risk_free_rate': round(risk_free_rate, 4),
+            'options': options
+        })
+
+    except Exception as e:
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/calculate-iv', methods=['POST'])
@@ -142,37 +254,91 @@ def calculate_iv():
     }
     """
     try:
-        data = request.json
+        req = schemas.decode(request.get_data(), schemas.CalculateIvReq)
 
-        # Fetch current market price
-        stock_data = market_data.get_stock_price(data['symbol'])
+        # Fetch current price and rate concurrently
+        stock_data, _, risk_free_rate = fetch_symbol_context(
+            market_data, req.symbol, need_volatility=False)
         current_price = stock_data['price']
 
-        # Get risk-free rate
-        risk_free_rate = market_data.get_risk_free_rate()
-
         # Calculate time to expiration
-        T = data['days_to_expiry'] / 365.0
+        T = req.days_to_expiry / 365.0
 
         # Calculate implied volatility
         iv = implied_volatility(
-            market_price=data['market_price'],
+            market_price=req.market_price,
             S=current_price,
-            K=data['strike'],
+            K=req.strike,
             T=T,
             r=risk_free_rate,
-            option_type=data['option_type'],
-            q=data.get('dividend_yield', 0)
+            option_type=req.option_type,
+            q=req.dividend_yield
         )
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'implied_volatility': round(iv, 4),
             'current_price': current_price
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/calculate-iv-batch', methods=['POST'])
+def calculate_iv_batch():
+    """
+    Calculate implied volatilities for a batch of options in one request.
+
+    Expected JSON:
+    {
+        "symbol": "AAPL",
+        "strikes": [140, 145, 150],
+        "days": [30, 30, 30],
+        "types": ["call", "call", "put"],
+        "market_prices": [12.10, 8.45, 4.20]
+    }
+    """
+    try:
+        req = schemas.decode(request.get_data(), schemas.CalculateIvBatchReq)
+
+        strikes = req.strikes
+        days = req.days
+        types = req.types
+        market_prices = req.market_prices
+
+        if not (len(strikes) == len(days) == len(types) == len(market_prices)):
+            raise ValueError("strikes, days, types and market_prices must have the same length")
+
+        # Fetch market data once for the whole batch
+        stock_data = market_data.get_stock_price(req.symbol)
+        current_price = stock_data['price']
+        risk_free_rate = market_data.get_risk_free_rate()
+
+        q = req.dividend_yield
+
+        # One vectorized Newton solve across the whole batch
+        iv_arr = implied_volatility_batch(
+            market_prices=np.array(market_prices, dtype=np.float64),
+            S=current_price,
+            K=np.array(strikes, dtype=np.float64),
+            T=np.array(days, dtype=np.float64) / 365.0,
+            r=risk_free_rate,
+            option_type=np.array(types),
+            q=q
+        )
+        ivs = [round(float(iv), 4) if np.isfinite(iv) else None
+               for iv in iv_arr]
+
+        return jsonify_fast({
+            'success': True,
+            'symbol': req.symbol,
+            'current_price': current_price,
+            'implied_volatilities': ivs
+        })
+
+    except Exception as e:
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/sell-option', methods=['POST'])
@@ -192,24 +358,26 @@ def sell_option():
     }
     """
     try:
-        data = request.json
+        req = schemas.decode(request.get_data(), schemas.SellOptionReq)
 
         # Parse expiration date
-        exp_date = datetime.strptime(data['expiration'], '%Y-%m-%d').date()
+        exp_date = datetime.strptime(req.expiration, '%Y-%m-%d').date()
 
         # Create position
         position = portfolio.add_position(
-            symbol=data['symbol'],
-            option_type=data['option_type'],
-            strike=data['strike'],
+            symbol=req.symbol,
+            option_type=req.option_type,
+            strike=req.strike,
             expiration=exp_date,
-            quantity=data['quantity'],
-            premium=data['premium'],
-            implied_vol=data.get('implied_vol'),
-            dividend_yield=data.get('dividend_yield', 0)
+            quantity=req.quantity,
+            premium=req.premium,
+            implied_vol=req.implied_vol,
+            dividend_yield=req.dividend_yield
         )
 
-        return jsonify({
+        clear_greeks_cache()
+
+        return jsonify_fast({
             'success': True,
             'position_id': position.id,
             'message': f"Position created successfully",
@@ -217,7 +385,7 @@ def sell_option():
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/calculate-hedge', methods=['POST'])
@@ -235,16 +403,16 @@ def calculate_hedge():
         position_id = data['position_id']
 
         hedge_req = hedger.calculate_hedge_requirements(
-            Position.query.get(position_id)
+            db.session.get(Position, position_id)
         )
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'hedge_requirements': hedge_req
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/execute-hedge', methods=['POST'])
@@ -263,9 +431,9 @@ def execute_hedge():
         position_id = data['position_id']
         hedge_shares = data.get('hedge_shares')
 
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
-            return jsonify({'success': False, 'error': 'Position not found'}), 404
+            return jsonify_fast({'success': False, 'error': 'Position not found'}), 404
 
         # Execute hedge
         hedge = hedger.execute_hedge(
@@ -273,49 +441,80 @@ def execute_hedge():
             hedge_shares=hedge_shares,
             hedge_type=data.get('hedge_type', 'initial')
         )
+        pnl_tracker.invalidate_pnl_memo(position_id)
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'message': 'Hedge executed successfully',
             'hedge': hedge.to_dict()
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
+
+
+def _positions_etag():
+    """
+    Cheap change token for position-derived responses.
+
+    Combines the newest position update, the row count, and the current
+    market-data cache window, so polling clients get 304s until either
+    a position changes or fresh quotes could alter the numbers.
+    """
+    max_upd, count = db.session.query(
+        db.func.max(Position.updated_at), db.func.count(Position.id)
+    ).first()
+    window = int(time.time() // config.MARKET_DATA_CACHE_SECONDS)
+    return hashlib.md5(f"{max_upd}-{count}-{window}".encode()).hexdigest()
+
+
+def _etag_response(payload_builder):
+    """Serve a 304 if the client's ETag still matches, else rebuild"""
+    etag = _positions_etag()
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+
+    response = payload_builder()
+    response.headers['ETag'] = etag
+    return response
 
 
 @app.route('/api/positions')
 def get_positions():
     """Get all positions"""
     try:
-        summary = portfolio.get_positions_summary()
-        return jsonify({
-            'success': True,
-            'summary': summary
-        })
+        def build():
+            prefetch_open_position_prices(market_data)
+            summary = portfolio.get_positions_summary()
+            return jsonify_fast({
+                'success': True,
+                'summary': summary
+            })
+
+        return _etag_response(build)
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/position/<int:position_id>')
 def get_position(position_id):
     """Get specific position details"""
     try:
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
-            return jsonify({'success': False, 'error': 'Position not found'}), 404
+            return jsonify_fast({'success': False, 'error': 'Position not found'}), 404
 
         pnl = pnl_tracker.calculate_position_pnl(position_id)
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'position': position.to_dict(),
             'pnl': pnl
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/close-position', methods=['POST'])
@@ -335,57 +534,81 @@ def close_position():
         close_price = data.get('close_price')
 
         final_pnl = portfolio.close_position(position_id, close_price)
+        clear_greeks_cache()
+        pnl_tracker.invalidate_pnl_memo(position_id)
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'message': 'Position closed successfully',
             'final_pnl': final_pnl
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/portfolio-greeks')
 def get_portfolio_greeks():
     """Get portfolio-level Greeks"""
     try:
-        greeks = portfolio.get_portfolio_greeks()
-        return jsonify({
-            'success': True,
-            'greeks': greeks
-        })
+        def build():
+            prefetch_open_position_prices(market_data)
+            greeks = portfolio.get_portfolio_greeks()
+            return jsonify_fast({
+                'success': True,
+                'greeks': greeks
+            })
+
+        return _etag_response(build)
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/portfolio-pnl')
 def get_portfolio_pnl():
     """Get portfolio P&L"""
     try:
+        prefetch_open_position_prices(market_data)
         pnl = pnl_tracker.get_portfolio_pnl()
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'pnl': pnl
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
+
+
+@app.route('/api/snapshot-pnl', methods=['POST'])
+def snapshot_pnl():
+    """Record a P&L snapshot for every open position (bulk insert)"""
+    try:
+        prefetch_open_position_prices(market_data)
+        count = pnl_tracker.snapshot_all()
+
+        return jsonify_fast({
+            'success': True,
+            'snapshots_written': count
+        })
+
+    except Exception as e:
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/delta-exposure')
 def get_delta_exposure():
     """Get portfolio delta exposure"""
     try:
+        prefetch_open_position_prices(market_data)
         exposure = hedger.get_portfolio_delta_exposure()
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'exposure': exposure
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/auto-rehedge', methods=['POST'])
@@ -402,15 +625,16 @@ def auto_rehedge():
         data = request.json
         execute = data.get('execute', False)
 
+        prefetch_open_position_prices(market_data)
         result = hedger.auto_rehedge_portfolio(execute=execute)
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'result': result
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/market-data/<symbol>')
@@ -420,7 +644,7 @@ def get_market_data(symbol):
         data = market_data.get_stock_price(symbol)
         vol = market_data.get_historical_volatility(symbol)
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'data': {
                 **data,
@@ -429,7 +653,7 @@ def get_market_data(symbol):
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/options-chain/<symbol>')
@@ -437,13 +661,13 @@ def get_options_chain(symbol):
     """Get options chain for a symbol"""
     try:
         chain = market_data.get_options_chain(symbol)
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'chain': chain
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/performance-metrics')
@@ -451,13 +675,13 @@ def get_performance_metrics():
     """Get portfolio performance metrics"""
     try:
         metrics = pnl_tracker.get_performance_metrics()
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'metrics': metrics
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/api/pnl-history')
@@ -469,13 +693,13 @@ def get_pnl_history():
 
         history = pnl_tracker.get_pnl_history(position_id=position_id, days=days)
 
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'history': history
         })
 
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify_fast({'success': False, 'error': str(e)}), 400
 
 
 @app.route('/positions')
@@ -491,15 +715,67 @@ def analytics_page():
 
 
 # Error handlers
+@app.errorhandler(msgspec.ValidationError)
+def invalid_request_body(error):
+    return jsonify_fast({'success': False, 'error': str(error)}, status=400)
+
+
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({'success': False, 'error': 'Not found'}), 404
+    return jsonify_fast({'success': False, 'error': 'Not found'}), 404
 
 
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
-    return jsonify({'success': False, 'error': 'Internal server error'}), 500
+    return jsonify_fast({'success': False, 'error': 'Internal server error'}), 500
+
+
+_MARKET_DATA_PREFIX = '/api/market-data/'
+
+
+class _MarketDataFastPath:
+    """
+    WSGI-level short-circuit for hot cache-only quote lookups.
+
+    GET /api/market-data/<symbol> is a pure TTL-cache read plus JSON
+    serialize, yet normally pays for Flask routing, request contexts,
+    and SQLAlchemy session teardown. When both the quote and the
+    historical volatility are already cached, this middleware answers
+    directly; any miss falls through to the regular Flask view, which
+    fetches and repopulates the cache.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if environ.get('REQUEST_METHOD') == 'GET' and path.startswith(_MARKET_DATA_PREFIX):
+            symbol = path[len(_MARKET_DATA_PREFIX):]
+            if symbol and '/' not in symbol:
+                with market_data._lock:
+                    data = market_data._price_cache.get(symbol)
+                    vol = market_data._vol_cache.get((symbol, '1y'))
+
+                if data is not None and vol is not None:
+                    body = dumps_bytes({
+                        'success': True,
+                        'data': {
+                            **data,
+                            'historical_volatility': round(vol, 4)
+                        }
+                    })
+                    start_response('200 OK', [
+                        ('Content-Type', 'application/json'),
+                        ('Content-Length', str(len(body)))
+                    ])
+                    return [body]
+
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = _MarketDataFastPath(app.wsgi_app)
 
 
 if __name__ == '__main__':
@@ -8,6 +8,8 @@ ALPHA_VANTAGE_API_KEY = ''
 
 # Email Configuration
 EMAIL_RECIPIENT = ''
+EMAIL_SENDER = ''
+EMAIL_PASSWORD = ''
 SMTP_SERVER = 'smtp.gmail.com'
 SMTP_PORT = 587
 
@@ -32,6 +34,7 @@ BID_ASK_SPREAD = 0.01  # 1% average bid-ask spread
 
 # Cache Configuration
 MARKET_DATA_CACHE_SECONDS = 60  # Cache market data for 60 seconds
+MARKET_DATA_BACKGROUND_REFRESH = True  # Poll held symbols so requests hit cache
 API_RATE_LIMIT_PER_MINUTE = 5  # Alpha Vantage free tier limit
 
 # Flask Configuration
@@ -4,58 +4,81 @@ Database Models
 SQLAlchemy models for storing positions, trades, hedges, and market data.
 """
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from sqlalchemy import func
+from datetime import datetime, timedelta
+from sqlalchemy import event, func
 
 db = SQLAlchemy()
 
 
+def _model_to_dict(obj, fields):
+    """
+    Build a plain dict from a model row via a precomputed field tuple.
+
+    Datetime/date values are passed through untouched; the orjson
+    response layer serializes them to ISO strings natively, so the
+    per-attribute isoformat() calls are no longer needed on hot
+    listing endpoints.
+    """
+    return {field: getattr(obj, field) for field in fields}
+
+
 class Position(db.Model):
     """Options positions (sold/bought)"""
     __tablename__ = 'positions'
 
+    __table_args__ = (
+        db.Index('ix_positions_status_expiration', 'status', 'expiration'),
+        # Partial index covering the hot `status == 'open'` filters (risk
+        # checks, expiry sweeps, stress tests): scans stay proportional
+        # to the open-position count, not total history
+        db.Index('ix_positions_open', 'expiration', 'symbol',
+                 sqlite_where=db.text("status = 'open'"),
+                 postgresql_where=db.text("status = 'open'")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     symbol = db.Column(db.String(10), nullable=False, index=True)
     option_type = db.Column(db.String(4), nullable=False)  # 'call' or 'put'
     strike = db.Column(db.Float, nullable=False)
     expiration = db.Column(db.Date, nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)  # Positive for long, negative for short
-    premium_collected = db.Column(db.Float)  # Premium per contract
+    premium_collected = db.Column(db.Float)  # Premium per contract, signed (+short/-long)
+    # Denormalized abs(quantity) * contract multiplier, precomputed at
+    # insert so the P&L hot path is a single multiply-add
+    notional_multiplier = db.Column(db.Float)
     entry_price = db.Column(db.Float, nullable=False)  # Underlying price at entry
-    entry_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    entry_date = db.Column(db.DateTime, server_default=func.now(), index=True)
+    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     status = db.Column(db.String(10), default='open')  # 'open', 'closed', 'expired'
     close_date = db.Column(db.DateTime)
     close_price = db.Column(db.Float)  # Option price at close
+    # Denormalized final total P&L, frozen when the position is closed
+    # or expired, so settled trades aggregate in SQL instead of being
+    # re-priced; NULL for legacy rows, which fall back to the live path
+    close_pnl = db.Column(db.Float)
     implied_vol = db.Column(db.Float)  # IV at entry
     risk_free_rate = db.Column(db.Float, default=0.05)
     dividend_yield = db.Column(db.Float, default=0.0)
 
     # Relationships
-    hedges = db.relationship('Hedge', backref='position', lazy='dynamic', cascade='all, delete-orphan')
+    # lazy='select' (not 'dynamic') so sweeps can eager-load hedges with
+    # joinedload instead of issuing one SELECT per position
+    hedges = db.relationship('Hedge', backref='position', lazy='select', cascade='all, delete-orphan')
     pnl_snapshots = db.relationship('PnLSnapshot', backref='position', lazy='dynamic', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Position {self.symbol} {self.option_type} {self.strike} exp:{self.expiration}>'
 
+    _DICT_FIELDS = (
+        'id', 'symbol', 'option_type', 'strike', 'expiration', 'quantity',
+        'premium_collected', 'entry_price', 'entry_date', 'status',
+        'close_date', 'close_price', 'implied_vol', 'risk_free_rate',
+        'dividend_yield'
+    )
+
     def to_dict(self):
         """Convert to dictionary"""
-        return {
-            'id': self.id,
-            'symbol': self.symbol,
-            'option_type': self.option_type,
-            'strike': self.strike,
-            'expiration': self.expiration.isoformat() if self.expiration else None,
-            'quantity': self.quantity,
-            'premium_collected': self.premium_collected,
-            'entry_price': self.entry_price,
-            'entry_date': self.entry_date.isoformat() if self.entry_date else None,
-            'status': self.status,
-            'close_date': self.close_date.isoformat() if self.close_date else None,
-            'close_price': self.close_price,
-            'implied_vol': self.implied_vol,
-            'risk_free_rate': self.risk_free_rate,
-            'dividend_yield': self.dividend_yield
-        }
+        return _model_to_dict(self, self._DICT_FIELDS)
 
 
 class Hedge(db.Model):
@@ -66,7 +89,7 @@ class Hedge(db.Model):
     position_id = db.Column(db.Integer, db.ForeignKey('positions.id'), nullable=False, index=True)
     hedge_quantity = db.Column(db.Float, nullable=False)  # Number of shares
     hedge_price = db.Column(db.Float, nullable=False)  # Price per share
-    hedge_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    hedge_date = db.Column(db.DateTime, server_default=func.now(), index=True)
     transaction_cost = db.Column(db.Float, default=0.0)  # Commissions + slippage
     delta_before = db.Column(db.Float)  # Delta before hedge
     delta_after = db.Column(db.Float)  # Delta after hedge
@@ -76,28 +99,39 @@ class Hedge(db.Model):
     def __repr__(self):
         return f'<Hedge pos:{self.position_id} qty:{self.hedge_quantity} @{self.hedge_price}>'
 
+    _DICT_FIELDS = (
+        'id', 'position_id', 'hedge_quantity', 'hedge_price', 'hedge_date',
+        'transaction_cost', 'delta_before', 'delta_after',
+        'underlying_price', 'hedge_type'
+    )
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'position_id': self.position_id,
-            'hedge_quantity': self.hedge_quantity,
-            'hedge_price': self.hedge_price,
-            'hedge_date': self.hedge_date.isoformat() if self.hedge_date else None,
-            'transaction_cost': self.transaction_cost,
-            'delta_before': self.delta_before,
-            'delta_after': self.delta_after,
-            'underlying_price': self.underlying_price,
-            'hedge_type': self.hedge_type
-        }
+        return _model_to_dict(self, self._DICT_FIELDS)
+
+
+# Snapshot storage precision: Greeks and money values are quantized to
+# 4 decimals at write time — sub-basis-point noise only bloats history
+# payloads and diffs between otherwise-identical snapshots
+SNAPSHOT_DECIMALS = 4
+
+
+def quantize_snapshot(value):
+    """Round a snapshot metric for storage (None passes through)"""
+    return None if value is None else round(value, SNAPSHOT_DECIMALS)
 
 
 class PnLSnapshot(db.Model):
     """P&L snapshots over time"""
     __tablename__ = 'pnl_snapshots'
 
+    __table_args__ = (
+        # Covering index so per-position history range scans are index-only
+        db.Index('ix_pnl_snapshots_position_date', 'position_id', 'snapshot_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     position_id = db.Column(db.Integer, db.ForeignKey('positions.id'), nullable=False, index=True)
-    snapshot_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    snapshot_date = db.Column(db.DateTime, server_default=func.now(), index=True)
     underlying_price = db.Column(db.Float, nullable=False)
     option_price = db.Column(db.Float, nullable=False)
     delta = db.Column(db.Float)
@@ -111,21 +145,14 @@ class PnLSnapshot(db.Model):
     def __repr__(self):
         return f'<PnLSnapshot pos:{self.position_id} pnl:{self.total_pnl}>'
 
+    _DICT_FIELDS = (
+        'id', 'position_id', 'snapshot_date', 'underlying_price',
+        'option_price', 'delta', 'gamma', 'vega', 'theta',
+        'unrealized_pnl', 'realized_pnl', 'total_pnl'
+    )
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'position_id': self.position_id,
-            'snapshot_date': self.snapshot_date.isoformat() if self.snapshot_date else None,
-            'underlying_price': self.underlying_price,
-            'option_price': self.option_price,
-            'delta': self.delta,
-            'gamma': self.gamma,
-            'vega': self.vega,
-            'theta': self.theta,
-            'unrealized_pnl': self.unrealized_pnl,
-            'realized_pnl': self.realized_pnl,
-            'total_pnl': self.total_pnl
-        }
+        return _model_to_dict(self, self._DICT_FIELDS)
 
 
 class MarketDataCache(db.Model):
@@ -139,21 +166,17 @@ class MarketDataCache(db.Model):
     ask = db.Column(db.Float)
     volume = db.Column(db.BigInteger)
     implied_vol = db.Column(db.Float)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    timestamp = db.Column(db.DateTime, server_default=func.now(), index=True)
 
     def __repr__(self):
         return f'<MarketData {self.symbol} @{self.price}>'
 
+    _DICT_FIELDS = (
+        'symbol', 'price', 'bid', 'ask', 'volume', 'implied_vol', 'timestamp'
+    )
+
     def to_dict(self):
-        return {
-            'symbol': self.symbol,
-            'price': self.price,
-            'bid': self.bid,
-            'ask': self.ask,
-            'volume': self.volume,
-            'implied_vol': self.implied_vol,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
-        }
+        return _model_to_dict(self, self._DICT_FIELDS)
 
 
 class Trade(db.Model):
@@ -167,24 +190,19 @@ class Trade(db.Model):
     quantity = db.Column(db.Float, nullable=False)
     price = db.Column(db.Float, nullable=False)
     commission = db.Column(db.Float, default=0.0)
-    trade_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    trade_date = db.Column(db.DateTime, server_default=func.now(), index=True)
     notes = db.Column(db.Text)
 
     def __repr__(self):
         return f'<Trade {self.trade_type} {self.symbol} qty:{self.quantity}>'
 
+    _DICT_FIELDS = (
+        'id', 'position_id', 'trade_type', 'symbol', 'quantity', 'price',
+        'commission', 'trade_date', 'notes'
+    )
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'position_id': self.position_id,
-            'trade_type': self.trade_type,
-            'symbol': self.symbol,
-            'quantity': self.quantity,
-            'price': self.price,
-            'commission': self.commission,
-            'trade_date': self.trade_date.isoformat() if self.trade_date else None,
-            'notes': self.notes
-        }
+        return _model_to_dict(self, self._DICT_FIELDS)
 
 
 class RiskLimit(db.Model):
@@ -195,28 +213,49 @@ class RiskLimit(db.Model):
     limit_type = db.Column(db.String(50), nullable=False, unique=True)  # 'max_delta', 'max_vega', etc.
     limit_value = db.Column(db.Float, nullable=False)
     current_value = db.Column(db.Float, default=0.0)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
     breach_count = db.Column(db.Integer, default=0)
 
     def __repr__(self):
         return f'<RiskLimit {self.limit_type}: {self.current_value}/{self.limit_value}>'
 
+    _DICT_FIELDS = (
+        'id', 'limit_type', 'limit_value', 'current_value', 'last_updated',
+        'breach_count'
+    )
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'limit_type': self.limit_type,
-            'limit_value': self.limit_value,
-            'current_value': self.current_value,
-            'last_updated': self.last_updated.isoformat() if self.last_updated else None,
-            'breach_count': self.breach_count,
-            'utilization': (self.current_value / self.limit_value * 100) if self.limit_value else 0
-        }
+        result = _model_to_dict(self, self._DICT_FIELDS)
+        result['utilization'] = (self.current_value / self.limit_value * 100) if self.limit_value else 0
+        return result
+
+
+def _sqlite_pragmas(dbapi_conn, _connection_record):
+    """
+    Tune SQLite on every new connection.
+
+    WAL journaling lets readers run while a hedge/P&L loop writes, and
+    synchronous=NORMAL drops the per-commit fsync that dominates bulk
+    snapshot inserts. Memory temp store, mmap and a larger page cache
+    keep hot reads off disk.
+    """
+    cursor = dbapi_conn.cursor()
+    for pragma in ("journal_mode=WAL",
+                   "synchronous=NORMAL",
+                   "temp_store=MEMORY",
+                   "mmap_size=268435456",
+                   "cache_size=-65536",
+                   "foreign_keys=ON"):
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
 
 
 def init_db(app):
     """Initialize database with app context"""
     db.init_app(app)
     with app.app_context():
+        if db.engine.url.drivername == 'sqlite':
+            event.listen(db.engine, 'connect', _sqlite_pragmas)
         db.create_all()
         # Initialize default risk limits if they don't exist
         if RiskLimit.query.count() == 0:
@@ -232,34 +271,47 @@ def init_db(app):
 
 
 def get_portfolio_summary():
-    """Get summary of all open positions"""
-    open_positions = Position.query.filter_by(status='open').all()
+    """Get summary of all open positions (aggregated in SQL)"""
+    today = datetime.now().date()
+    cutoff = today + timedelta(days=7)
 
     summary = {
-        'total_positions': len(open_positions),
+        'total_positions': Position.query.filter_by(status='open').count(),
         'total_value': 0,
         'positions_by_symbol': {},
         'positions_by_type': {'call': 0, 'put': 0},
         'expiring_soon': []
     }
 
-    for pos in open_positions:
-        # Count by type
-        summary['positions_by_type'][pos.option_type] += abs(pos.quantity)
-
-        # Group by symbol
-        if pos.symbol not in summary['positions_by_symbol']:
-            summary['positions_by_symbol'][pos.symbol] = 0
-        summary['positions_by_symbol'][pos.symbol] += abs(pos.quantity)
-
-        # Check expiring soon (within 7 days)
-        days_to_expiry = (pos.expiration - datetime.now().date()).days
-        if days_to_expiry <= 7:
-            summary['expiring_soon'].append({
-                'id': pos.id,
-                'symbol': pos.symbol,
-                'expiration': pos.expiration,
-                'days': days_to_expiry
-            })
+    # Per-symbol/per-type contract counts aggregated by the database,
+    # so only group rows cross the wire instead of every position
+    grouped = db.session.query(
+        Position.symbol,
+        Position.option_type,
+        func.sum(func.abs(Position.quantity))
+    ).filter_by(status='open').group_by(
+        Position.symbol, Position.option_type
+    ).all()
+
+    for symbol, option_type, quantity in grouped:
+        summary['positions_by_type'][option_type] += quantity
+        summary['positions_by_symbol'][symbol] = \
+            summary['positions_by_symbol'].get(symbol, 0) + quantity
+
+    # Indexed range scan on (status, expiration) for expiring positions
+    expiring = db.session.query(
+        Position.id, Position.symbol, Position.expiration
+    ).filter(
+        Position.status == 'open',
+        Position.expiration <= cutoff
+    ).all()
+
+    for pos_id, symbol, expiration in expiring:
+        summary['expiring_soon'].append({
+            'id': pos_id,
+            'symbol': symbol,
+            'expiration': expiration,
+            'days': (expiration - today).days
+        })
 
     return summary
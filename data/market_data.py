@@ -4,25 +4,76 @@ Market Data Integration
 Fetches real-time and historical market data from Alpha Vantage API
 and other data sources. Includes caching to manage API rate limits.
 """
+import numpy as np
+import os
 import requests
+import threading
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import lru_cache
 import json
 
+try:
+    import bottleneck as bn
+    _HAS_BOTTLENECK = True
+except ImportError:
+    _HAS_BOTTLENECK = False
+
+try:
+    import diskcache
+    _HAS_DISKCACHE = True
+except ImportError:
+    _HAS_DISKCACHE = False
+
+_DISK_CACHE_DIR = os.path.expanduser('~/.broker_cache')
+
+
+def cache_key(*parts, **kwargs):
+    """
+    Build a stable cache key from positional parts and keyword args.
+
+    Keyword args are sorted alphabetically so the same parameters
+    always produce the same key regardless of call-site ordering.
+    """
+    key = '_'.join(str(p) for p in parts)
+    if kwargs:
+        key += '_' + '_'.join(f"{k}={kwargs[k]}" for k in sorted(kwargs))
+    return key
+
 
 class MarketDataCache:
-    """Simple in-memory cache for market data"""
+    """
+    TTL cache for market data, persisted on disk when diskcache is
+    available so quotes survive process restarts (a cold start within
+    the TTL no longer re-hits the rate-limited APIs). Falls back to a
+    plain in-memory dict otherwise.
+    """
 
-    def __init__(self, ttl_seconds=60):
-        self.cache = {}
+    def __init__(self, ttl_seconds=60, max_size_mb=64, max_entries=1024):
+        self._persistent = _HAS_DISKCACHE
+        if self._persistent:
+            # diskcache evicts by size_limit on its own
+            self.cache = diskcache.Cache(
+                _DISK_CACHE_DIR, size_limit=max_size_mb * 1024 * 1024)
+        else:
+            # LRU-capped fallback so long-running sessions scanning
+            # many symbols cannot grow the cache without bound
+            self.cache = OrderedDict()
         self.ttl = ttl_seconds
+        self.max_entries = max_entries
 
-    def get(self, key):
+    def get(self, key, ttl=None):
+        """Get a cached value; ttl overrides the default for this lookup"""
         if key in self.cache:
             data, timestamp = self.cache[key]
-            if time.time() - timestamp < self.ttl:
+            if time.time() - timestamp < (ttl if ttl is not None else self.ttl):
+                if not self._persistent:
+                    self.cache.move_to_end(key)  # keep recent items warm
                 return data
             else:
                 del self.cache[key]
@@ -30,11 +81,48 @@ class MarketDataCache:
 
     def set(self, key, value):
         self.cache[key] = (value, time.time())
+        if not self._persistent and len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
 
     def clear(self):
         self.cache.clear()
 
 
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    Unlike a fixed inter-request sleep, a bucket lets short bursts go
+    through back-to-back (up to `capacity` requests) while still
+    respecting the average rate, so a page fetching a handful of
+    symbols does not stall between each one.
+    """
+
+    def __init__(self, capacity=5, refill_rate=5 / 60.0):
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # tokens per second
+        self.tokens = float(capacity)
+        self.last_refill = time.time()
+
+    def acquire(self):
+        """
+        Take one token, returning the seconds to wait first (0 if the
+        request may proceed immediately).
+        """
+        now = time.time()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        wait = (1 - self.tokens) / self.refill_rate
+        self.tokens = 0.0
+        return wait
+
+
 class AlphaVantageClient:
     """Client for Alpha Vantage API"""
 
@@ -42,21 +130,32 @@ class AlphaVantageClient:
         self.api_key = api_key
         self.base_url = 'https://www.alphavantage.co/query'
         self.cache = MarketDataCache(ttl_seconds=cache_ttl)
-        self.last_request_time = 0
-        self.min_request_interval = 12  # 5 requests per minute = 12 seconds between requests
+        # Alpha Vantage free tier allows 5 requests per minute
+        self.bucket = TokenBucket(capacity=5, refill_rate=5 / 60.0)
+
+        # Keep-alive session: reuses the TCP/TLS connection across
+        # calls instead of a fresh handshake per request, and retries
+        # transient 5xx responses with exponential backoff
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip'})
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=10,
+            max_retries=Retry(total=3, backoff_factor=0.5,
+                              status_forcelist=(500, 502, 503, 504))
+        )
+        self.session.mount('https://', adapter)
 
     def _rate_limit(self):
-        """Enforce rate limiting"""
-        time_since_last_request = time.time() - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
+        """Enforce rate limiting (burst-friendly token bucket)"""
+        wait = self.bucket.acquire()
+        if wait > 0:
+            time.sleep(wait)
 
     def _make_request(self, params):
         """Make API request with rate limiting"""
         self._rate_limit()
-        response = requests.get(self.base_url, params=params, timeout=10)
+        response = self.session.get(self.base_url, params=params, timeout=10)
         response.raise_for_status()
         return response.json()
 
@@ -112,20 +211,24 @@ class AlphaVantageClient:
         """Fallback method using yfinance"""
         try:
             ticker = yf.Ticker(symbol)
-            info = ticker.info
             hist = ticker.history(period='1d')
 
             if not hist.empty:
                 current_price = hist['Close'].iloc[-1]
+                volume = int(hist['Volume'].iloc[-1])
             else:
+                # .info scrapes the whole quoteSummary (slow, often
+                # throttled); only touch it when history came back empty
+                info = ticker.info
                 current_price = info.get('currentPrice', info.get('previousClose', 0))
+                volume = 0
 
             result = {
                 'symbol': symbol,
                 'price': float(current_price),
                 'change': 0,
                 'change_percent': '0%',
-                'volume': int(hist['Volume'].iloc[-1]) if not hist.empty else 0,
+                'volume': volume,
                 'timestamp': datetime.now()
             }
             return result
@@ -180,6 +283,11 @@ class AlphaVantageClient:
         float
             Annualized historical volatility
         """
+        cache_key = f"histvol_{symbol}_{period}"
+        cached = self.cache.get(cache_key, ttl=21600)  # hist vol barely moves intraday
+        if cached is not None:
+            return cached
+
         try:
             ticker = yf.Ticker(symbol)
             hist = ticker.history(period=period)
@@ -187,12 +295,15 @@ class AlphaVantageClient:
             if hist.empty:
                 raise ValueError("No historical data available")
 
-            # Calculate log returns
-            returns = hist['Close'].pct_change().dropna()
+            # Log returns on the raw ndarray: one diff/log pass, no
+            # pandas index alignment or intermediate Series
+            closes = hist['Close'].to_numpy()
+            log_returns = np.diff(np.log(closes))
 
             # Annualized volatility (assuming 252 trading days)
-            volatility = returns.std() * (252 ** 0.5)
+            volatility = log_returns.std(ddof=1) * np.sqrt(252)
 
+            self.cache.set(cache_key, volatility)
             return volatility
         except Exception as e:
             print(f"Error calculating volatility for {symbol}: {e}")
@@ -214,21 +325,27 @@ class YahooFinanceClient:
 
         try:
             ticker = yf.Ticker(symbol)
-            info = ticker.info
             hist = ticker.history(period='1d')
 
             if not hist.empty:
+                # Fast path: one history() call; .info scrapes the full
+                # quoteSummary (~hundreds of ms and Yahoo-throttled), so
+                # settle for last-trade bid/ask approximations
                 current_price = hist['Close'].iloc[-1]
                 volume = hist['Volume'].iloc[-1]
+                bid = ask = current_price
             else:
+                info = ticker.info
                 current_price = info.get('currentPrice', info.get('previousClose', 0))
                 volume = info.get('volume', 0)
+                bid = info.get('bid', current_price)
+                ask = info.get('ask', current_price)
 
             result = {
                 'symbol': symbol,
                 'price': float(current_price),
-                'bid': float(info.get('bid', current_price)),
-                'ask': float(info.get('ask', current_price)),
+                'bid': float(bid),
+                'ask': float(ask),
                 'volume': int(volume),
                 'timestamp': datetime.now()
             }
@@ -239,6 +356,63 @@ class YahooFinanceClient:
         except Exception as e:
             raise ValueError(f"Could not fetch price for {symbol}: {e}")
 
+    def get_stock_prices_batch(self, symbols):
+        """
+        Get current prices for several symbols in one download.
+
+        A single multi-ticker yf.download call replaces one HTTPS
+        round-trip per symbol, which dominates portfolio-wide sweeps.
+
+        Parameters:
+        -----------
+        symbols : iterable of str
+            Stock ticker symbols
+
+        Returns:
+        --------
+        dict
+            Mapping of symbol -> price data dict. Symbols with no data
+            are omitted.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+
+        results = {}
+        try:
+            data = yf.download(symbols, period='1d', group_by='ticker',
+                               progress=False, threads=True)
+
+            if data.empty:
+                return {}
+
+            for symbol in symbols:
+                try:
+                    # Single-symbol downloads come back without the
+                    # per-ticker column level
+                    frame = data[symbol] if len(symbols) > 1 else data
+                    closes = frame['Close'].dropna()
+                    if closes.empty:
+                        continue
+                    volumes = frame['Volume'].dropna()
+                    price = float(closes.iloc[-1])
+                    results[symbol] = {
+                        'symbol': symbol,
+                        'price': price,
+                        'bid': price,
+                        'ask': price,
+                        'volume': int(volumes.iloc[-1]) if not volumes.empty else 0,
+                        'timestamp': datetime.now()
+                    }
+                    self.cache.set(f"yf_quote_{symbol}", results[symbol])
+                except (KeyError, IndexError):
+                    continue
+
+        except Exception as e:
+            print(f"Batch price download failed: {e}")
+
+        return results
+
     def get_options_chain(self, symbol):
         """
         Get options chain data.
@@ -267,13 +441,25 @@ class YahooFinanceClient:
                 'chains': {}
             }
 
-            for expiry in expirations[:5]:  # Limit to first 5 expirations
+            wanted = expirations[:5]  # Limit to first 5 expirations
+
+            def _fetch_chain(expiry):
                 chain = ticker.option_chain(expiry)
-                options_data['chains'][expiry] = {
-                    'calls': chain.calls.to_dict('records'),
-                    'puts': chain.puts.to_dict('records')
+                # Columnar form: one list per column instead of one
+                # dict per row, avoiding thousands of per-row PyObject
+                # allocations and feeding the vectorized pricers
+                # arrays directly; still JSON-serializable as-is
+                return expiry, {
+                    'calls': chain.calls.to_dict('list'),
+                    'puts': chain.puts.to_dict('list')
                 }
 
+            # Each expiry is a separate HTTPS round-trip; fetching them
+            # concurrently costs max(t_i) instead of sum(t_i)
+            with ThreadPoolExecutor(max_workers=len(wanted)) as executor:
+                for expiry, chain_data in executor.map(_fetch_chain, wanted):
+                    options_data['chains'][expiry] = chain_data
+
             return options_data
 
         except Exception as e:
@@ -297,6 +483,11 @@ class YahooFinanceClient:
         float
             Annualized historical volatility
         """
+        cache_key = f"histvol_{symbol}_{period}"
+        cached = self.cache.get(cache_key, ttl=21600)
+        if cached is not None:
+            return cached
+
         try:
             ticker = yf.Ticker(symbol)
             hist = ticker.history(period=period)
@@ -304,18 +495,72 @@ class YahooFinanceClient:
             if hist.empty:
                 return 0.30
 
-            # Calculate log returns
-            returns = hist['Close'].pct_change().dropna()
+            # Log returns on the raw ndarray, skipping pandas overhead
+            closes = hist['Close'].to_numpy()
+            log_returns = np.diff(np.log(closes))
 
             # Annualized volatility
-            volatility = returns.std() * (252 ** 0.5)
+            volatility = log_returns.std(ddof=1) * np.sqrt(252)
 
+            self.cache.set(cache_key, volatility)
             return volatility
 
         except Exception as e:
             print(f"Error calculating volatility: {e}")
             return 0.30
 
+    def get_rolling_volatility(self, symbol, period='1y', window=30):
+        """
+        Rolling annualized volatility series over a trailing window.
+
+        Uses bottleneck's C move_std (running-sum updates, O(N) instead
+        of O(N*window)) when available, with a strided NumPy fallback.
+
+        Parameters:
+        -----------
+        symbol : str
+            Stock ticker symbol
+        period : str
+            Historical period
+        window : int
+            Rolling window in trading days
+
+        Returns:
+        --------
+        ndarray or None
+            Annualized rolling volatility per day; the first window-1
+            entries are NaN. None if no data is available.
+        """
+        try:
+            ticker = yf.Ticker(symbol)
+            hist = ticker.history(period=period)
+
+            if hist.empty:
+                return None
+
+            closes = hist['Close'].to_numpy()
+            log_returns = np.diff(np.log(closes))
+
+            if len(log_returns) < window:
+                return None
+
+            if _HAS_BOTTLENECK:
+                rolling = bn.move_std(log_returns, window=window,
+                                      min_count=window, ddof=1)
+            else:
+                windows = np.lib.stride_tricks.sliding_window_view(
+                    log_returns, window)
+                rolling = np.concatenate([
+                    np.full(window - 1, np.nan),
+                    windows.std(axis=1, ddof=1)
+                ])
+
+            return rolling * np.sqrt(252)
+
+        except Exception as e:
+            print(f"Error calculating rolling volatility for {symbol}: {e}")
+            return None
+
     def get_risk_free_rate(self):
         """
         Get current risk-free rate (using 10-year Treasury).
@@ -325,6 +570,10 @@ class YahooFinanceClient:
         float
             Risk-free rate
         """
+        cached = self.cache.get('rfr', ttl=3600)  # yield moves slowly
+        if cached is not None:
+            return cached
+
         try:
             # ^TNX is the ticker for 10-year Treasury yield
             tnx = yf.Ticker("^TNX")
@@ -333,6 +582,7 @@ class YahooFinanceClient:
             if not hist.empty:
                 # Convert from percentage to decimal
                 rate = hist['Close'].iloc[-1] / 100
+                self.cache.set('rfr', rate)
                 return rate
             else:
                 return 0.05  # Default 5%
@@ -347,11 +597,24 @@ class MarketDataManager:
     Unified market data manager that handles multiple data sources.
     """
 
-    def __init__(self, alpha_vantage_key=None, use_yfinance=True):
+    def __init__(self, alpha_vantage_key=None, use_yfinance=True, prewarm=True):
         self.av_client = AlphaVantageClient(alpha_vantage_key) if alpha_vantage_key else None
         self.yf_client = YahooFinanceClient() if use_yfinance else None
         self.preferred_source = 'yfinance' if use_yfinance else 'alphavantage'
 
+        if prewarm and self.yf_client:
+            # Warm the risk-free rate cache off the request path so the
+            # first pricing action finds it instead of paying a ~500ms
+            # yfinance round-trip
+            threading.Thread(target=self._prewarm, daemon=True,
+                             name='market-data-prewarm').start()
+
+    def _prewarm(self):
+        try:
+            self.get_risk_free_rate()
+        except Exception as e:
+            print(f"Risk-free rate prewarm failed: {e}")
+
     def get_stock_price(self, symbol):
         """Get stock price from preferred source with fallback"""
         if self.preferred_source == 'yfinance' and self.yf_client:
@@ -367,6 +630,28 @@ class MarketDataManager:
         else:
             raise ValueError("No market data source available")
 
+    def get_stock_prices_batch(self, symbols):
+        """
+        Get prices for many symbols in one multi-ticker download.
+
+        Falls back to per-symbol lookups for any symbols the batch
+        download missed (or entirely, when yfinance is disabled).
+        """
+        symbols = list(dict.fromkeys(symbols))
+        results = {}
+
+        if self.yf_client:
+            results = self.yf_client.get_stock_prices_batch(symbols)
+
+        for symbol in symbols:
+            if symbol not in results:
+                try:
+                    results[symbol] = self.get_stock_price(symbol)
+                except Exception as e:
+                    print(f"Error fetching price for {symbol}: {e}")
+
+        return results
+
     def get_options_chain(self, symbol):
         """Get options chain data"""
         if self.yf_client:
@@ -4,10 +4,53 @@ Black-Scholes Option Pricing Model
 Implements the Black-Scholes formula for European options pricing
 and implied volatility calculation.
 """
+import math
 import numpy as np
-from scipy.stats import norm
+from collections import namedtuple
+from scipy.special import ndtr, log_ndtr
 from scipy.optimize import brentq
 
+try:
+    from models.black_scholes_numba import (_bs_price, _bs_delta, _bs_price_arr,
+                                            _bs_price_arr_par, _iv_newton,
+                                            _price_and_greeks)
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+_INV_SQRT2 = 0.7071067811865476
+_INV_SQRT2PI = 0.3989422804014327
+
+# Normal-CDF strategy: scalar call sites use math.erf below (cheaper
+# than any scipy wrapper for a single float), array call sites go
+# straight to scipy.special.ndtr (the C kernel under norm.cdf, without
+# its per-call validation layer), and the numba kernels inline an
+# Abramowitz-Stegun polynomial since scipy isn't callable from nopython.
+
+
+def _ncdf(x):
+    """Standard normal CDF via math.erf (no scipy call overhead)"""
+    return 0.5 * (1.0 + math.erf(x * _INV_SQRT2))
+
+
+def _npdf(x):
+    """Standard normal PDF"""
+    return _INV_SQRT2PI * math.exp(-0.5 * x * x)
+
+
+def _is_call_mask(option_type):
+    """
+    Convert an option_type argument ('call'/'put', bool, or an array of
+    either) to a boolean is_call mask for the vectorized kernels.
+    """
+    arr = np.asarray(option_type)
+    if arr.dtype.kind in ('U', 'S'):
+        mask = arr == 'call'
+        if not np.all(mask | (arr == 'put')):
+            raise ValueError("option_type must be 'call' or 'put'")
+        return mask
+    return arr.astype(bool)
+
 
 def black_scholes_price(S, K, T, r, sigma, option_type='call', q=0):
     """
@@ -32,9 +75,15 @@ def black_scholes_price(S, K, T, r, sigma, option_type='call', q=0):
 
     Returns:
     --------
-    float
-        Option price
+    float or ndarray
+        Option price(s)
     """
+    # Array inputs: one broadcasted pass over the whole chain instead
+    # of a Python-level call per option
+    if any(np.ndim(x) for x in (S, K, T, r, sigma, q)) or np.ndim(option_type):
+        return bs_greeks_vec(S, K, T, r, sigma, q,
+                             _is_call_mask(option_type))['price']
+
     if T <= 0:
         # Handle expiration
         if option_type == 'call':
@@ -45,17 +94,21 @@ def black_scholes_price(S, K, T, r, sigma, option_type='call', q=0):
     if sigma <= 0:
         raise ValueError("Volatility must be positive")
 
-    # Calculate d1 and d2
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    if option_type not in ('call', 'put'):
+        raise ValueError("option_type must be 'call' or 'put'")
+
+    # Hot path: JIT-compiled kernel with inlined normal CDF
+    if _HAS_NUMBA:
+        return _bs_price(S, K, T, r, sigma, q, option_type == 'call')
+
+    # Shared subexpressions computed once
+    t = _bs_terms(S, K, T, r, sigma, q)
 
     # Calculate option price
     if option_type == 'call':
-        price = S * np.exp(-q * T) * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    elif option_type == 'put':
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * np.exp(-q * T) * norm.cdf(-d1)
+        price = S * t.disc_q * _ncdf(t.d1) - K * t.disc_r * _ncdf(t.d2)
     else:
-        raise ValueError("option_type must be 'call' or 'put'")
+        price = K * t.disc_r * _ncdf(-t.d2) - S * t.disc_q * _ncdf(-t.d1)
 
     return price
 
@@ -86,31 +139,268 @@ def calculate_delta(S, K, T, r, sigma, option_type='call', q=0):
 
     Returns:
     --------
-    float
-        Delta value
+    float or ndarray
+        Delta value(s)
     """
+    if any(np.ndim(x) for x in (S, K, T, r, sigma, q)) or np.ndim(option_type):
+        return bs_greeks_vec(S, K, T, r, sigma, q,
+                             _is_call_mask(option_type))['delta']
+
     if T <= 0:
         if option_type == 'call':
             return 1.0 if S > K else 0.0
         else:
             return -1.0 if S < K else 0.0
 
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+    if option_type not in ('call', 'put'):
+        raise ValueError("option_type must be 'call' or 'put'")
+
+    if _HAS_NUMBA:
+        return _bs_delta(S, K, T, r, sigma, q, option_type == 'call')
+
+    t = _bs_terms(S, K, T, r, sigma, q)
 
     if option_type == 'call':
-        delta = np.exp(-q * T) * norm.cdf(d1)
-    elif option_type == 'put':
-        delta = np.exp(-q * T) * (norm.cdf(d1) - 1)
+        delta = t.disc_q * _ncdf(t.d1)
     else:
-        raise ValueError("option_type must be 'call' or 'put'")
+        delta = t.disc_q * (_ncdf(t.d1) - 1)
 
     return delta
 
 
+def price_and_greeks(S, K, T, r, sigma, option_type='call', q=0):
+    """
+    Calculate option price and all Greeks in one fused evaluation.
+
+    Callers that mark a position and snapshot its Greeks need both for
+    the same inputs; pricing and Greeks separately evaluates d1/d2 and
+    the normal CDF/PDF terms twice. This computes the shared
+    intermediates once and returns both, matching black_scholes_price
+    and calculate_all_greeks.
+
+    Parameters:
+    -----------
+    S : float
+        Current stock price
+    K : float
+        Strike price
+    T : float
+        Time to expiration in years
+    r : float
+        Risk-free interest rate
+    sigma : float
+        Volatility
+    option_type : str
+        'call' or 'put'
+    q : float
+        Dividend yield
+
+    Returns:
+    --------
+    tuple
+        (price, dict of delta/gamma/vega/theta/rho)
+    """
+    if option_type not in ('call', 'put'):
+        raise ValueError("option_type must be 'call' or 'put'")
+
+    is_call = option_type == 'call'
+
+    if T <= 0:
+        # At expiration: intrinsic value, step-function delta
+        if is_call:
+            price = max(0.0, S - K)
+            delta = 1.0 if S > K else 0.0
+        else:
+            price = max(0.0, K - S)
+            delta = -1.0 if S < K else 0.0
+        return price, {'delta': delta, 'gamma': 0.0, 'vega': 0.0,
+                       'theta': 0.0, 'rho': 0.0}
+
+    # Hot path: one JIT-compiled pass for the price and all five Greeks
+    if _HAS_NUMBA:
+        price, delta, gamma, vega, theta, rho = _price_and_greeks(
+            S, K, T, r, sigma, q, is_call)
+        return price, {'delta': delta, 'gamma': gamma, 'vega': vega,
+                       'theta': theta, 'rho': rho}
+
+    # Shared subexpressions computed once
+    t = _bs_terms(S, K, T, r, sigma, q)
+    Nd1 = _ncdf(t.d1)
+    Nd2 = _ncdf(t.d2)
+
+    gamma = t.disc_q * t.pdf_d1 / (S * sigma * t.sqrtT)
+    vega = S * t.disc_q * t.pdf_d1 * t.sqrtT / 100
+    theta_common = -(S * t.disc_q * t.pdf_d1 * sigma) / (2 * t.sqrtT)
+
+    if is_call:
+        price = S * t.disc_q * Nd1 - K * t.disc_r * Nd2
+        delta = t.disc_q * Nd1
+        theta = (theta_common + q * S * t.disc_q * Nd1
+                 - r * K * t.disc_r * Nd2) / 365
+        rho = K * T * t.disc_r * Nd2 / 100
+    else:
+        price = K * t.disc_r * (1 - Nd2) - S * t.disc_q * (1 - Nd1)
+        delta = t.disc_q * (Nd1 - 1)
+        theta = (theta_common - q * S * t.disc_q * (1 - Nd1)
+                 + r * K * t.disc_r * (1 - Nd2)) / 365
+        rho = -K * T * t.disc_r * (1 - Nd2) / 100
+
+    return price, {'delta': delta, 'gamma': gamma, 'vega': vega,
+                   'theta': theta, 'rho': rho}
+
+
+def _sr_initial_guess(market_price, S, K, T, r, q=0):
+    """
+    Stefanica-Radoicic closed-form implied volatility approximation.
+
+    Computes an explicit initial guess for a call option from the
+    Polya approximation of the normal CDF. Accurate to a few percent
+    across strikes, which is enough for the polishing iterations in
+    implied_volatility_rational to converge in two steps.
+
+    Returns:
+    --------
+    float
+        Approximate implied volatility (annualized)
+    """
+    F = S * np.exp((r - q) * T)
+    y = np.log(F / K)
+    disc_K = K * np.exp(-r * T)
+
+    alpha = market_price / disc_K
+    R = 2 * alpha - np.exp(y) + 1
+
+    # Polya-based polynomial coefficients
+    a = np.exp((1 - 2 / np.pi) * y)
+    b = np.exp((2 / np.pi) * y)
+
+    A = (a - 1 / a) ** 2
+    B = 4 * (b + 1 / b) - 2 * np.exp(-y) * (a + 1 / a) * (np.exp(2 * y) + 1 - R**2)
+    C = np.exp(-2 * y) * (R**2 - (np.exp(y) - 1) ** 2) * ((np.exp(y) + 1) ** 2 - R**2)
+
+    if C <= 0 or B + np.sqrt(max(B**2 + 4 * A * C, 0)) <= 0:
+        # Degenerate (price at an arbitrage bound); fall back to a flat guess
+        return 0.3
+
+    beta = 2 * C / (B + np.sqrt(B**2 + 4 * A * C))
+    gamma_term = -np.pi / 2 * np.log(beta)
+
+    if y >= 0:
+        C0 = disc_K * (np.exp(y) * _ncdf(np.sqrt(2 * y)) - 0.5)
+        if market_price <= C0:
+            total_vol = np.sqrt(gamma_term + y) - np.sqrt(gamma_term - y)
+        else:
+            total_vol = np.sqrt(gamma_term + y) + np.sqrt(gamma_term - y)
+    else:
+        C0 = disc_K * (np.exp(y) / 2 - _ncdf(-np.sqrt(-2 * y)))
+        if market_price <= C0:
+            total_vol = -np.sqrt(gamma_term + y) + np.sqrt(gamma_term - y)
+        else:
+            total_vol = np.sqrt(gamma_term + y) + np.sqrt(gamma_term - y)
+
+    return total_vol / np.sqrt(T)
+
+
+def implied_volatility_rational(market_price, S, K, T, r, q=0, is_call=True,
+                                tolerance=1e-6):
+    """
+    Calculate implied volatility using a rational approximation.
+
+    Uses the Stefanica-Radoicic closed-form initial guess followed by
+    two Halley (second-order Householder) iterations, so there is no
+    open-ended convergence loop. Unlike plain Newton-Raphson with a
+    fixed starting point, this stays robust for deep ITM/OTM options
+    where vega is tiny. A Brent bisection pass on [1e-6, 5] is used as
+    a safety net if the residual is still above tolerance.
+
+    Parameters:
+    -----------
+    market_price : float
+        Observed market price of the option
+    S : float
+        Current stock price
+    K : float
+        Strike price
+    T : float
+        Time to expiration in years
+    r : float
+        Risk-free interest rate
+    q : float
+        Dividend yield
+    is_call : bool
+        True for a call, False for a put
+    tolerance : float
+        Relative price tolerance
+
+    Returns:
+    --------
+    float
+        Implied volatility
+    """
+    if T <= 0:
+        raise ValueError("Cannot calculate IV for expired options")
+
+    # Work with the equivalent call price via put-call parity
+    if is_call:
+        call_price = market_price
+    else:
+        call_price = market_price + S * np.exp(-q * T) - K * np.exp(-r * T)
+
+    intrinsic = max(0, S * np.exp(-q * T) - K * np.exp(-r * T))
+    if call_price < intrinsic:
+        raise ValueError("Market price below intrinsic value")
+
+    sigma = _sr_initial_guess(call_price, S, K, T, r, q)
+    if not np.isfinite(sigma) or sigma <= 0:
+        sigma = 0.3
+
+    # Two Halley iterations sharing d1/d2/vega per step
+    for _ in range(2):
+        t = _bs_terms(S, K, T, r, sigma, q)
+        # erf-based CDF cancels catastrophically below ~-6; use the
+        # erfc-backed log_ndtr in the deep-OTM wing so the Newton/Halley
+        # residual stays accurate there
+        Nd2 = _ncdf(t.d2) if t.d2 > -6.0 else float(np.exp(log_ndtr(t.d2)))
+        price = S * t.disc_q * _ncdf(t.d1) - K * t.disc_r * Nd2
+        vega = S * t.disc_q * t.pdf_d1 * t.sqrtT
+
+        diff = price - call_price
+        if vega < 1e-12:
+            break
+
+        # Halley update: vomma = vega * d1 * d2 / sigma
+        newton_step = diff / vega
+        vomma_ratio = t.d1 * t.d2 / sigma
+        denom = 1 - 0.5 * newton_step * vomma_ratio
+        sigma = sigma - (newton_step / denom if denom > 0.5 else newton_step)
+
+        if sigma <= 0:
+            sigma = 0.01
+
+    # Verify; fall back to bracketed root finding only if polishing failed
+    final_price = black_scholes_price(S, K, T, r, sigma, 'call', q)
+    if abs(final_price - call_price) > tolerance * max(call_price, 1e-8):
+        if _HAS_NUMBA:
+            # Compiled safeguarded Newton: the whole solve runs as one
+            # machine-code loop instead of ~30 Python objective calls
+            sigma = _iv_newton(call_price, S, K, T, r, q, sigma, tolerance)
+        else:
+            def objective(vol):
+                return black_scholes_price(S, K, T, r, vol, 'call', q) - call_price
+
+            sigma = brentq(objective, 1e-6, 5.0, xtol=1e-8)
+
+    return sigma
+
+
 def implied_volatility(market_price, S, K, T, r, option_type='call', q=0,
                        initial_sigma=0.3, max_iterations=100, tolerance=1e-6):
     """
-    Calculate implied volatility using Newton-Raphson method.
+    Calculate implied volatility.
+
+    Delegates to implied_volatility_rational (Stefanica-Radoicic guess
+    plus two Halley iterations with a Brent safety net), which replaces
+    the old Newton-Raphson loop that could stall when vega is small.
 
     Parameters:
     -----------
@@ -153,44 +443,285 @@ def implied_volatility(market_price, S, K, T, r, option_type='call', q=0,
         if market_price < intrinsic:
             raise ValueError("Market price below intrinsic value")
 
-    # Use Brent's method for robust root finding
-    def objective(sigma):
+    return implied_volatility_rational(
+        market_price, S, K, T, r, q=q,
+        is_call=(option_type == 'call'),
+        tolerance=tolerance
+    )
+
+
+def bs_price_array(S, K, T, r, sigma, q=0, is_call=True, out=None):
+    """
+    Maximum-throughput batch pricing on contiguous float64 buffers.
+
+    For workloads that evaluate the formula millions of times (Monte
+    Carlo, IV-surface fits), this routes to a single compiled loop with
+    no NumPy temporaries; pass `out` to reuse a preallocated result
+    buffer across calls. Falls back to the broadcasting kernel when
+    numba is unavailable.
+
+    Returns:
+    --------
+    ndarray
+        Option prices
+    """
+    if not _HAS_NUMBA:
+        prices = bs_greeks_vec(S, K, T, r, sigma, q, is_call)['price']
+        if out is not None:
+            out[...] = prices
+            return out
+        return prices
+
+    S, K, T, r, sigma, q, is_call = np.broadcast_arrays(
+        np.asarray(S, dtype=np.float64),
+        np.asarray(K, dtype=np.float64),
+        np.asarray(T, dtype=np.float64),
+        np.asarray(r, dtype=np.float64),
+        np.asarray(sigma, dtype=np.float64),
+        np.asarray(q, dtype=np.float64),
+        np.asarray(is_call, dtype=bool)
+    )
+    if out is None:
+        out = np.empty(S.shape, dtype=np.float64)
+
+    # Thread fan-out only pays for itself on large batches; below the
+    # threshold the serial kernel avoids the scheduling overhead
+    kernel = _bs_price_arr_par if S.size >= 20000 else _bs_price_arr
+    kernel(np.ascontiguousarray(S.ravel()),
+           np.ascontiguousarray(K.ravel()),
+           np.ascontiguousarray(T.ravel()),
+           np.ascontiguousarray(r.ravel()),
+           np.ascontiguousarray(sigma.ravel()),
+           np.ascontiguousarray(q.ravel()),
+           np.ascontiguousarray(is_call.ravel()),
+           out.reshape(-1))
+    return out
+
+
+def implied_volatility_batch(market_prices, S, K, T, r, option_type='call',
+                             q=0, tolerance=1e-6, max_iterations=12):
+    """
+    Vectorized implied volatility for a whole batch of options.
+
+    Runs Newton-Raphson on the full arrays simultaneously — one ndtr
+    and one exp per iteration across the batch instead of a Python
+    solver invocation per option. Entries that fail to converge are
+    polished individually with implied_volatility_rational; entries
+    priced below their arbitrage bound come back as NaN.
+
+    Parameters:
+    -----------
+    market_prices : array_like
+        Observed market prices
+    S : float or array_like
+        Current stock price(s)
+    K : array_like
+        Strike prices
+    T : array_like
+        Times to expiration in years
+    r : float or array_like
+        Risk-free interest rate
+    option_type : str or array_like
+        'call'/'put' per option (or a single value for the batch)
+    q : float or array_like
+        Dividend yield
+    tolerance : float
+        Relative price tolerance
+    max_iterations : int
+        Newton iterations before falling back per element
+
+    Returns:
+    --------
+    ndarray
+        Implied volatilities, NaN where no valid IV exists
+    """
+    is_call = _is_call_mask(option_type)
+    market_prices, S, K, T, r, q, is_call = np.broadcast_arrays(
+        np.asarray(market_prices, dtype=np.float64),
+        np.asarray(S, dtype=np.float64),
+        np.asarray(K, dtype=np.float64),
+        np.asarray(T, dtype=np.float64),
+        np.asarray(r, dtype=np.float64),
+        np.asarray(q, dtype=np.float64),
+        is_call
+    )
+
+    T_safe = np.maximum(T, 1e-10)
+    sqrtT = np.sqrt(T_safe)
+    disc_q = np.exp(-q * T_safe)
+    disc_r = np.exp(-r * T_safe)
+
+    # Work on equivalent call prices via put-call parity
+    call_prices = np.where(is_call, market_prices,
+                           market_prices + S * disc_q - K * disc_r)
+
+    intrinsic = np.maximum(S * disc_q - K * disc_r, 0)
+    invalid = (T <= 0) | (call_prices < intrinsic)
+
+    # Brenner-Subrahmanyam initial guess, clipped to the search range
+    sigma = np.sqrt(2 * np.pi / T_safe) * call_prices / S
+    sigma = np.where(np.isfinite(sigma) & (sigma > 0), sigma, 0.3)
+    sigma = np.clip(sigma, 1e-4, 5.0)
+
+    tol = tolerance * np.maximum(call_prices, 1e-8)
+    converged = np.zeros(sigma.shape, dtype=bool)
+
+    for _ in range(max_iterations):
+        d1 = (np.log(S / K) + (r - q + 0.5 * sigma**2) * T_safe) / (sigma * sqrtT)
+        d2 = d1 - sigma * sqrtT
+        price = S * disc_q * ndtr(d1) - K * disc_r * ndtr(d2)
+        vega = S * disc_q * np.exp(-0.5 * d1 * d1) * _INV_SQRT2PI * sqrtT
+
+        diff = price - call_prices
+        converged |= np.abs(diff) <= tol
+        if np.all(converged | invalid):
+            break
+
+        step = diff / np.maximum(vega, 1e-12)
+        sigma = np.where(converged, sigma, np.clip(sigma - step, 1e-4, 5.0))
+
+    result = np.where(invalid, np.nan, sigma)
+
+    # Per-element fallback for the few entries Newton missed
+    for idx in np.flatnonzero(~(converged | invalid)):
         try:
-            return black_scholes_price(S, K, T, r, sigma, option_type, q) - market_price
-        except:
-            return float('inf')
+            result.flat[idx] = implied_volatility_rational(
+                float(market_prices.flat[idx]), float(S.flat[idx]),
+                float(K.flat[idx]), float(T.flat[idx]), float(r.flat[idx]),
+                q=float(q.flat[idx]), is_call=bool(is_call.flat[idx]),
+                tolerance=tolerance
+            )
+        except ValueError:
+            result.flat[idx] = np.nan
 
-    try:
-        # Search between 0.01 and 5.0 (1% to 500% volatility)
-        iv = brentq(objective, 0.01, 5.0, xtol=tolerance, maxiter=max_iterations)
-        return iv
-    except ValueError:
-        # If Brent's method fails, try Newton-Raphson
-        sigma = initial_sigma
+    return result
 
-        for i in range(max_iterations):
-            # Calculate vega for Newton-Raphson step
-            d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
-            vega = S * np.exp(-q * T) * norm.pdf(d1) * np.sqrt(T)
 
-            if vega < 1e-10:
-                raise ValueError("Vega too small, cannot converge")
+def bs_greeks_vec(S, K, T, r, sigma, q=0, is_call=True):
+    """
+    Vectorized Black-Scholes price and Greeks for arrays of options.
 
-            # Calculate price difference
-            price_diff = black_scholes_price(S, K, T, r, sigma, option_type, q) - market_price
+    Computes d1/d2 and the normal CDF/PDF terms once and reuses them
+    across price, delta, gamma, vega, theta, and rho. All inputs are
+    broadcast against each other, so a whole option chain can be priced
+    in a single call.
 
-            # Check convergence
-            if abs(price_diff) < tolerance:
-                return sigma
+    Parameters:
+    -----------
+    S : float or array_like
+        Current stock price(s)
+    K : float or array_like
+        Strike price(s)
+    T : float or array_like
+        Time(s) to expiration in years
+    r : float or array_like
+        Risk-free interest rate
+    sigma : float or array_like
+        Volatility
+    q : float or array_like
+        Dividend yield
+    is_call : bool or array_like
+        True for calls, False for puts
 
-            # Newton-Raphson update
-            sigma = sigma - price_diff / vega
+    Returns:
+    --------
+    dict
+        Dictionary of NumPy arrays: price, delta, gamma, vega, theta, rho.
+        Vega, theta, and rho use the same per-1%/per-day scaling as the
+        scalar Greeks in models.greeks.
+    """
+    S = np.asarray(S, dtype=np.float64)
+    K = np.asarray(K, dtype=np.float64)
+    T = np.asarray(T, dtype=np.float64)
+    r = np.asarray(r, dtype=np.float64)
+    sigma = np.asarray(sigma, dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+    is_call = np.asarray(is_call, dtype=bool)
+
+    # Degenerate rows (expired, or zero/negative vol) would push
+    # NaN/inf through the whole ufunc chain below; give them safe dummy
+    # inputs here and overwrite their outputs with intrinsic value and
+    # zero Greeks at the end
+    live = (T > 0) & (sigma > 0)
+    T_safe = np.where(live, T, 1.0)
+    sigma_safe = np.where(live, sigma, 1.0)
+
+    sqrtT = np.sqrt(T_safe)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma_safe**2) * T_safe) / (sigma_safe * sqrtT)
+    d2 = d1 - sigma_safe * sqrtT
+
+    # Branchless call/put handling: sign=+1 prices calls, -1 puts, using
+    # the identities put = -(S e^{-qT} Phi(-d1) - K e^{-rT} Phi(-d2)) etc.
+    sign = np.where(is_call, 1.0, -1.0)
+
+    # Shared CDF/PDF evaluations
+    sNd1 = ndtr(sign * d1)
+    sNd2 = ndtr(sign * d2)
+    nd1 = np.exp(-0.5 * d1 * d1) * _INV_SQRT2PI
+
+    disc_q = np.exp(-q * T_safe)
+    disc_r = np.exp(-r * T_safe)
+
+    price = sign * (S * disc_q * sNd1 - K * disc_r * sNd2)
+
+    delta = sign * disc_q * sNd1
+    gamma = disc_q * nd1 / (S * sigma_safe * sqrtT)
+    vega = S * disc_q * nd1 * sqrtT / 100
+
+    theta_common = -(S * disc_q * nd1 * sigma_safe) / (2 * sqrtT)
+    theta = (theta_common
+             + sign * (q * S * disc_q * sNd1 - r * K * disc_r * sNd2)) / 365
+
+    rho = sign * K * T_safe * disc_r * sNd2 / 100
+
+    # Degenerate options: intrinsic value, zero Greeks except delta
+    # (expired rows keep their old semantics; sigma<=0 rows get the
+    # sigma->0 limit instead of NaN)
+    expired = ~live
+    if np.any(expired):
+        intrinsic = np.where(is_call, np.maximum(S - K, 0), np.maximum(K - S, 0))
+        price = np.where(expired, intrinsic, price)
+        # sign*(S-K) > 0 means in the money for the given side, so the
+        # step delta is just the sign masked by moneyness — no per-side
+        # select needed
+        exp_delta = sign * (sign * (S - K) > 0)
+        delta = np.where(expired, exp_delta, delta)
+        gamma = np.where(expired, 0.0, gamma)
+        vega = np.where(expired, 0.0, vega)
+        theta = np.where(expired, 0.0, theta)
+        rho = np.where(expired, 0.0, rho)
+
+    return {
+        'price': price,
+        'delta': delta,
+        'gamma': gamma,
+        'vega': vega,
+        'theta': theta,
+        'rho': rho
+    }
+
+
+BSTerms = namedtuple('BSTerms', 'd1 d2 sqrtT disc_r disc_q pdf_d1')
+
+
+def _bs_terms(S, K, T, r, sigma, q=0):
+    """
+    Compute the shared Black-Scholes subexpressions exactly once.
 
-            # Ensure sigma stays positive
-            if sigma <= 0:
-                sigma = 0.01
+    Every pricing function and Greek needs some subset of d1, d2,
+    sqrt(T), the discount factors, and the pdf at d1; returning them
+    as one struct lets a caller that needs several avoid recomputing
+    the transcendentals.
 
-        raise ValueError(f"Failed to converge after {max_iterations} iterations")
+    Returns:
+    --------
+    BSTerms
+        Named tuple (d1, d2, sqrtT, disc_r, disc_q, pdf_d1)
+    """
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+    return BSTerms(d1, d2, sqrtT, math.exp(-r * T), math.exp(-q * T), _npdf(d1))
 
 
 def _d1_d2(S, K, T, r, sigma, q=0):
@@ -202,9 +733,34 @@ def _d1_d2(S, K, T, r, sigma, q=0):
     tuple
         (d1, d2)
     """
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    return d1, d2
+    terms = _bs_terms(S, K, T, r, sigma, q)
+    return terms.d1, terms.d2
+
+
+def _warm_up():
+    """
+    Exercise the hot kernels once at import time.
+
+    The first call to a NumPy ufunc chain (and any numba kernel pulled
+    in via black_scholes_price) pays dtype negotiation / JIT compile
+    cost; absorbing it at module load keeps it out of the first HTTP
+    request.
+    """
+    arr = np.array([100.0])
+    bs_greeks_vec(arr, arr, np.array([0.1]), 0.05, np.array([0.2]),
+                  0.0, np.array([True]))
+    implied_volatility_rational(5.0, 100.0, 100.0, 0.25, 0.05)
+
+    # Self-check on the batch paths: call prices must fall
+    # monotonically in strike. Catches silent miscompiles of the
+    # fastmath/numba kernels before they can serve a request.
+    K = np.linspace(80.0, 120.0, 64)
+    chain = bs_price_array(100.0, K, 30 / 365, 0.05, 0.25)
+    if chain.shape != K.shape or not np.all(np.diff(chain) < 0):
+        raise RuntimeError("Black-Scholes batch kernel self-check failed")
+
+
+_warm_up()
 
 
 # Validation function
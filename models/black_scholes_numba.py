@@ -0,0 +1,271 @@
+"""
+Numba-compiled Black-Scholes kernels
+
+JIT-compiled scalar kernels for the hot pricing paths. The normal CDF
+is inlined via math.erf so the kernels compile to tight machine code
+with no scipy call overhead. Importing this module warms the JIT cache
+with a dummy evaluation so the first real request does not pay the
+compile cost.
+
+These kernels assume validated inputs (T > 0, sigma > 0); the Python
+wrappers in models.black_scholes handle edge cases and errors.
+"""
+import math
+import numpy as np
+from numba import njit, prange
+
+_INV_SQRT_2 = 0.7071067811865476
+_INV_SQRT_2PI = 0.3989422804014327
+
+
+@njit(cache=True, fastmath=True)
+def _norm_cdf(x):
+    """Standard normal CDF via math.erf"""
+    return 0.5 * (1.0 + math.erf(x * _INV_SQRT_2))
+
+
+@njit(cache=True, fastmath=True)
+def _norm_pdf(x):
+    """Standard normal PDF"""
+    return _INV_SQRT_2PI * math.exp(-0.5 * x * x)
+
+
+@njit(cache=True, fastmath=True)
+def _bs_price(S, K, T, r, sigma, q, is_call):
+    """Black-Scholes price for a single option (branchless call/put)"""
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+
+    sign = 2.0 * is_call - 1.0
+    return sign * (S * math.exp(-q * T) * _norm_cdf(sign * d1)
+                   - K * math.exp(-r * T) * _norm_cdf(sign * d2))
+
+
+@njit(cache=True, fastmath=True)
+def _bs_delta(S, K, T, r, sigma, q, is_call):
+    """Black-Scholes delta for a single option (branchless call/put)"""
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * math.sqrt(T))
+
+    sign = 2.0 * is_call - 1.0
+    return sign * math.exp(-q * T) * _norm_cdf(sign * d1)
+
+
+@njit(cache=True, fastmath=True)
+def _all_greeks(S, K, T, r, sigma, q, is_call):
+    """
+    All Greeks in one pass sharing d1/d2 and the CDF/PDF evaluations.
+
+    Returns (delta, gamma, vega, theta, rho) with the same per-1% and
+    per-day scaling as models.greeks.
+    """
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+
+    nd1 = _norm_pdf(d1)
+    Nd1 = _norm_cdf(d1)
+    Nd2 = _norm_cdf(d2)
+
+    disc_q = math.exp(-q * T)
+    disc_r = math.exp(-r * T)
+
+    gamma = disc_q * nd1 / (S * sigma * sqrtT)
+    vega = S * disc_q * nd1 * sqrtT / 100.0
+
+    theta_common = -(S * disc_q * nd1 * sigma) / (2.0 * sqrtT)
+
+    if is_call:
+        delta = disc_q * Nd1
+        theta = (theta_common + q * S * disc_q * Nd1 - r * K * disc_r * Nd2) / 365.0
+        rho = K * T * disc_r * Nd2 / 100.0
+    else:
+        delta = disc_q * (Nd1 - 1.0)
+        theta = (theta_common - q * S * disc_q * (1.0 - Nd1)
+                 + r * K * disc_r * (1.0 - Nd2)) / 365.0
+        rho = -K * T * disc_r * (1.0 - Nd2) / 100.0
+
+    return delta, gamma, vega, theta, rho
+
+
+@njit(cache=True, fastmath=True)
+def _price_and_greeks(S, K, T, r, sigma, q, is_call):
+    """
+    Price and all Greeks in one pass sharing every transcendental.
+
+    The P&L path needs both the mark and the Greeks for identical
+    inputs; fusing them halves the log/exp/erf count versus calling
+    _bs_price and _all_greeks separately. Returns (price, delta, gamma,
+    vega, theta, rho) with the usual per-1%/per-day scaling.
+    """
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+
+    nd1 = _norm_pdf(d1)
+    Nd1 = _norm_cdf(d1)
+    Nd2 = _norm_cdf(d2)
+
+    disc_q = math.exp(-q * T)
+    disc_r = math.exp(-r * T)
+
+    gamma = disc_q * nd1 / (S * sigma * sqrtT)
+    vega = S * disc_q * nd1 * sqrtT / 100.0
+
+    theta_common = -(S * disc_q * nd1 * sigma) / (2.0 * sqrtT)
+
+    if is_call:
+        price = S * disc_q * Nd1 - K * disc_r * Nd2
+        delta = disc_q * Nd1
+        theta = (theta_common + q * S * disc_q * Nd1 - r * K * disc_r * Nd2) / 365.0
+        rho = K * T * disc_r * Nd2 / 100.0
+    else:
+        price = K * disc_r * (1.0 - Nd2) - S * disc_q * (1.0 - Nd1)
+        delta = disc_q * (Nd1 - 1.0)
+        theta = (theta_common - q * S * disc_q * (1.0 - Nd1)
+                 + r * K * disc_r * (1.0 - Nd2)) / 365.0
+        rho = -K * T * disc_r * (1.0 - Nd2) / 100.0
+
+    return price, delta, gamma, vega, theta, rho
+
+
+@njit(cache=True, fastmath=True)
+def _fast_norm_cdf(x):
+    """
+    Abramowitz-Stegun 26.2.17 rational approximation of the normal CDF.
+
+    Max error ~1e-7 in ~10 FLOPs versus erf's much longer polynomial —
+    plenty for solver iterations that only chase a 1e-6 tolerance.
+    """
+    ax = abs(x)
+    k = 1.0 / (1.0 + 0.2316419 * ax)
+    poly = k * (0.319381530 + k * (-0.356563782 + k * (1.781477937
+               + k * (-1.821255978 + k * 1.330274429))))
+    w = 1.0 - _norm_pdf(ax) * poly
+    return w if x >= 0.0 else 1.0 - w
+
+
+@njit(cache=True, fastmath=True)
+def _bs_price_fast(S, K, T, r, sigma, q):
+    """Call price using the A&S CDF; solver-iteration accuracy only"""
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+    return (S * math.exp(-q * T) * _fast_norm_cdf(d1)
+            - K * math.exp(-r * T) * _fast_norm_cdf(d2))
+
+
+@njit(cache=True, fastmath=True)
+def _bs_price_arr(S, K, T, r, sigma, q, is_call, out):
+    """
+    Price a contiguous batch of options into a preallocated buffer.
+
+    A single compiled loop over float64 arrays: no NumPy temporaries,
+    and the erf/exp/log chain auto-vectorizes under fastmath. Expired
+    entries (T <= 0) get intrinsic value.
+    """
+    for i in range(S.shape[0]):
+        if T[i] <= 0.0:
+            if is_call[i]:
+                out[i] = max(S[i] - K[i], 0.0)
+            else:
+                out[i] = max(K[i] - S[i], 0.0)
+        else:
+            out[i] = _bs_price(S[i], K[i], T[i], r[i], sigma[i], q[i],
+                               is_call[i])
+    return out
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _bs_price_arr_par(S, K, T, r, sigma, q, is_call, out):
+    """Multi-threaded variant of _bs_price_arr for large batches"""
+    for i in prange(S.shape[0]):
+        if T[i] <= 0.0:
+            if is_call[i]:
+                out[i] = max(S[i] - K[i], 0.0)
+            else:
+                out[i] = max(K[i] - S[i], 0.0)
+        else:
+            out[i] = _bs_price(S[i], K[i], T[i], r[i], sigma[i], q[i],
+                               is_call[i])
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def _iv_newton(call_price, S, K, T, r, q, sigma0, tolerance):
+    """
+    Safeguarded Newton implied-volatility solve for a call, fully
+    compiled so the whole iteration runs without Python round-trips.
+
+    Keeps a [lo, hi] bracket (price is monotone in sigma) and falls
+    back to bisection whenever the Newton step leaves it or vega is
+    too small to trust.
+    """
+    lo = 1e-6
+    hi = 5.0
+    sigma = sigma0
+    if sigma <= lo or sigma >= hi:
+        sigma = 0.3
+
+    tol = tolerance * max(call_price, 1e-8)
+
+    for _ in range(100):
+        # A&S CDF inside the loop (~1e-7 accurate, ~3x cheaper than
+        # erf); the polish below re-checks at full precision
+        price = _bs_price_fast(S, K, T, r, sigma, q)
+        diff = price - call_price
+
+        if abs(diff) <= tol:
+            break
+
+        if diff > 0.0:
+            hi = sigma
+        else:
+            lo = sigma
+
+        sqrtT = math.sqrt(T)
+        d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+        vega = S * math.exp(-q * T) * _norm_pdf(d1) * sqrtT
+
+        if vega > 1e-12:
+            step = sigma - diff / vega
+        else:
+            step = 0.5 * (lo + hi)
+
+        if step <= lo or step >= hi:
+            step = 0.5 * (lo + hi)
+
+        sigma = step
+
+    # Full-precision (erf) Newton polish of the A&S solution
+    for _ in range(2):
+        diff = _bs_price(S, K, T, r, sigma, q, True) - call_price
+        if abs(diff) <= tol:
+            break
+        sqrtT = math.sqrt(T)
+        d1 = (math.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrtT)
+        vega = S * math.exp(-q * T) * _norm_pdf(d1) * sqrtT
+        if vega <= 1e-12:
+            break
+        sigma = min(max(sigma - diff / vega, 1e-6), 5.0)
+
+    return sigma
+
+
+def _warm_up():
+    """Trigger JIT compilation at import so requests never pay it"""
+    _bs_price(100.0, 100.0, 0.25, 0.05, 0.2, 0.0, True)
+    _bs_delta(100.0, 100.0, 0.25, 0.05, 0.2, 0.0, False)
+    _all_greeks(100.0, 100.0, 0.25, 0.05, 0.2, 0.0, True)
+    _price_and_greeks(100.0, 100.0, 0.25, 0.05, 0.2, 0.0, True)
+    _iv_newton(5.0, 100.0, 100.0, 0.25, 0.05, 0.0, 0.3, 1e-6)
+    arr = np.full(1, 100.0)
+    _bs_price_arr(arr, arr, np.full(1, 0.25), np.full(1, 0.05),
+                  np.full(1, 0.2), np.full(1, 0.0),
+                  np.ones(1, dtype=np.bool_), np.empty(1))
+    _bs_price_arr_par(arr, arr, np.full(1, 0.25), np.full(1, 0.05),
+                      np.full(1, 0.2), np.full(1, 0.0),
+                      np.ones(1, dtype=np.bool_), np.empty(1))
+
+
+_warm_up()
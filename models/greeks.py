@@ -4,8 +4,21 @@ Greeks Calculator
 Calculates option Greeks (sensitivities) for risk management and hedging.
 Greeks measure how option prices change with respect to various factors.
 """
+import functools
+import math
 import numpy as np
-from scipy.stats import norm
+from models.black_scholes import _is_call_mask, _ncdf, _npdf, bs_greeks_vec
+
+
+def _is_vectorized(S, K, T, sigma, q):
+    """True when any pricing input is array-shaped"""
+    return any(np.ndim(x) for x in (S, K, T, sigma, q))
+
+try:
+    from models.black_scholes_numba import _all_greeks, _bs_delta
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
 
 
 def calculate_all_greeks(S, K, T, r, sigma, option_type='call', q=0):
@@ -34,14 +47,80 @@ def calculate_all_greeks(S, K, T, r, sigma, option_type='call', q=0):
     dict
         Dictionary containing all Greeks: delta, gamma, vega, theta, rho
     """
-    greeks = {
-        'delta': delta(S, K, T, r, sigma, option_type, q),
-        'gamma': gamma(S, K, T, r, sigma, q),
-        'vega': vega(S, K, T, r, sigma, q),
-        'theta': theta(S, K, T, r, sigma, option_type, q),
-        'rho': rho(S, K, T, r, sigma, option_type, q)
+    # Hot path: one JIT-compiled pass sharing d1/d2 and CDF/PDF terms
+    if _HAS_NUMBA and T > 0:
+        d, g, v, t, rh = _all_greeks(S, K, T, r, sigma, q, option_type == 'call')
+        return {'delta': d, 'gamma': g, 'vega': v, 'theta': t, 'rho': rh}
+
+    if T <= 0:
+        return {
+            'delta': delta(S, K, T, r, sigma, option_type, q),
+            'gamma': 0.0,
+            'vega': 0.0,
+            'theta': 0.0,
+            'rho': 0.0
+        }
+
+    # Fused fallback: compute d1/d2 and the shared CDF/PDF/discount
+    # terms once instead of once per Greek. math.* on the scalar
+    # inputs: no ufunc dispatch or 0-d array boxing per call
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+
+    nd1 = _npdf(d1)
+    Nd1 = _ncdf(d1)
+    Nd2 = _ncdf(d2)
+
+    disc_q = math.exp(-q * T)
+    disc_r = math.exp(-r * T)
+
+    gamma_value = disc_q * nd1 / (S * sigma * sqrtT)
+    vega_value = S * disc_q * nd1 * sqrtT / 100
+    theta_common = -(S * disc_q * nd1 * sigma) / (2 * sqrtT)
+
+    if option_type == 'call':
+        delta_value = disc_q * Nd1
+        theta_value = (theta_common + q * S * disc_q * Nd1
+                       - r * K * disc_r * Nd2) / 365
+        rho_value = K * T * disc_r * Nd2 / 100
+    else:
+        delta_value = disc_q * (Nd1 - 1)
+        theta_value = (theta_common - q * S * disc_q * (1 - Nd1)
+                       + r * K * disc_r * (1 - Nd2)) / 365
+        rho_value = -K * T * disc_r * (1 - Nd2) / 100
+
+    return {
+        'delta': delta_value,
+        'gamma': gamma_value,
+        'vega': vega_value,
+        'theta': theta_value,
+        'rho': rho_value
     }
-    return greeks
+
+
+@functools.lru_cache(maxsize=4096)
+def _greeks_cached(S_q, K, T_q, r_q, sigma_q, option_type, q_q):
+    """Memoized Greeks on quantized inputs; treat the result as read-only"""
+    return calculate_all_greeks(S_q, K, T_q, r_q, sigma_q, option_type, q_q)
+
+
+def calculate_all_greeks_cached(S, K, T, r, sigma, option_type='call', q=0):
+    """
+    Memoized variant of calculate_all_greeks.
+
+    Inputs are quantized (price to cents, time/rates/vol to 4 decimals)
+    before the cache lookup, so near-identical calls within the market
+    data cache window hit the memo instead of recomputing. Call
+    clear_greeks_cache() whenever positions change.
+    """
+    return _greeks_cached(round(S, 2), K, round(T, 4), round(r, 4),
+                          round(sigma, 4), option_type, round(q, 4))
+
+
+def clear_greeks_cache():
+    """Invalidate the memoized Greeks (e.g. after trades or rehedges)"""
+    _greeks_cached.cache_clear()
 
 
 def delta(S, K, T, r, sigma, option_type='call', q=0):
@@ -70,21 +149,33 @@ def delta(S, K, T, r, sigma, option_type='call', q=0):
 
     Returns:
     --------
-    float
+    float or ndarray
         Delta value (between 0 and 1 for calls, -1 and 0 for puts)
     """
+    # Array inputs: branchless np.where-based expiry handling in the
+    # vectorized kernel instead of the scalar T<=0 guard
+    if _is_vectorized(S, K, T, sigma, q) or np.ndim(option_type):
+        return bs_greeks_vec(S, K, T, r, sigma, q,
+                             _is_call_mask(option_type))['delta']
+
     if T <= 0:
         if option_type == 'call':
             return 1.0 if S > K else 0.0
         else:
             return -1.0 if S < K else 0.0
 
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+    # Hot path: JIT-compiled kernel with inlined normal CDF, warmed at
+    # import so per-position rehedge checks never pay Python math
+    if _HAS_NUMBA:
+        return _bs_delta(S, K, T, r, sigma, q, option_type == 'call')
+
+    # Scalar fallback on math.* — this branch only ever sees floats
+    d1 = (math.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * math.sqrt(T))
 
     if option_type == 'call':
-        return np.exp(-q * T) * norm.cdf(d1)
+        return math.exp(-q * T) * _ncdf(d1)
     else:  # put
-        return np.exp(-q * T) * (norm.cdf(d1) - 1)
+        return math.exp(-q * T) * (_ncdf(d1) - 1)
 
 
 def gamma(S, K, T, r, sigma, q=0):
@@ -111,15 +202,19 @@ def gamma(S, K, T, r, sigma, q=0):
 
     Returns:
     --------
-    float
+    float or ndarray
         Gamma value
     """
+    if _is_vectorized(S, K, T, sigma, q):
+        return bs_greeks_vec(S, K, T, r, sigma, q, True)['gamma']
+
     if T <= 0:
         return 0.0
 
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * sqrtT)
 
-    gamma_value = (np.exp(-q * T) * norm.pdf(d1)) / (S * sigma * np.sqrt(T))
+    gamma_value = (math.exp(-q * T) * _npdf(d1)) / (S * sigma * sqrtT)
 
     return gamma_value
 
@@ -151,15 +246,19 @@ def vega(S, K, T, r, sigma, q=0):
 
     Returns:
     --------
-    float
+    float or ndarray
         Vega value (per 1% change in volatility)
     """
+    if _is_vectorized(S, K, T, sigma, q):
+        return bs_greeks_vec(S, K, T, r, sigma, q, True)['vega']
+
     if T <= 0:
         return 0.0
 
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * sqrtT)
 
-    vega_value = S * np.exp(-q * T) * norm.pdf(d1) * np.sqrt(T)
+    vega_value = S * math.exp(-q * T) * _npdf(d1) * sqrtT
 
     # Return vega per 1% change in volatility
     return vega_value / 100
@@ -191,25 +290,33 @@ def theta(S, K, T, r, sigma, option_type='call', q=0):
 
     Returns:
     --------
-    float
+    float or ndarray
         Theta value (per day)
     """
+    if _is_vectorized(S, K, T, sigma, q) or np.ndim(option_type):
+        return bs_greeks_vec(S, K, T, r, sigma, q,
+                             _is_call_mask(option_type))['theta']
+
     if T <= 0:
         return 0.0
 
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
+
+    disc_q = math.exp(-q * T)
+    disc_r = math.exp(-r * T)
 
     # Common term
-    term1 = -(S * np.exp(-q * T) * norm.pdf(d1) * sigma) / (2 * np.sqrt(T))
+    term1 = -(S * disc_q * _npdf(d1) * sigma) / (2 * sqrtT)
 
     if option_type == 'call':
-        term2 = q * S * np.exp(-q * T) * norm.cdf(d1)
-        term3 = -r * K * np.exp(-r * T) * norm.cdf(d2)
+        term2 = q * S * disc_q * _ncdf(d1)
+        term3 = -r * K * disc_r * _ncdf(d2)
         theta_value = term1 + term2 + term3
     else:  # put
-        term2 = -q * S * np.exp(-q * T) * norm.cdf(-d1)
-        term3 = r * K * np.exp(-r * T) * norm.cdf(-d2)
+        term2 = -q * S * disc_q * _ncdf(-d1)
+        term3 = r * K * disc_r * _ncdf(-d2)
         theta_value = term1 + term2 + term3
 
     # Return theta per day
@@ -242,19 +349,24 @@ def rho(S, K, T, r, sigma, option_type='call', q=0):
 
     Returns:
     --------
-    float
+    float or ndarray
         Rho value (per 1% change in interest rate)
     """
+    if _is_vectorized(S, K, T, sigma, q) or np.ndim(option_type):
+        return bs_greeks_vec(S, K, T, r, sigma, q,
+                             _is_call_mask(option_type))['rho']
+
     if T <= 0:
         return 0.0
 
-    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    sqrtT = math.sqrt(T)
+    d1 = (math.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * sqrtT)
+    d2 = d1 - sigma * sqrtT
 
     if option_type == 'call':
-        rho_value = K * T * np.exp(-r * T) * norm.cdf(d2)
+        rho_value = K * T * math.exp(-r * T) * _ncdf(d2)
     else:  # put
-        rho_value = -K * T * np.exp(-r * T) * norm.cdf(-d2)
+        rho_value = -K * T * math.exp(-r * T) * _ncdf(-d2)
 
     # Return rho per 1% change in interest rate
     return rho_value / 100
@@ -319,31 +431,46 @@ def portfolio_greeks(positions):
     dict
         Portfolio Greeks
     """
-    portfolio = {
-        'delta': 0,
-        'gamma': 0,
-        'vega': 0,
-        'theta': 0,
-        'rho': 0
-    }
+    return portfolio_greeks_vec(positions)
+
+
+def portfolio_greeks_vec(positions):
+    """
+    Vectorized portfolio-level Greeks.
 
-    for position in positions:
-        quantity = position['quantity']
-        greeks = calculate_all_greeks(
-            S=position['S'],
-            K=position['K'],
-            T=position['T'],
-            r=position['r'],
-            sigma=position['sigma'],
-            option_type=position['option_type'],
-            q=position.get('q', 0)
-        )
-
-        # Aggregate Greeks (weighted by position size)
-        for greek in portfolio:
-            portfolio[greek] += greeks[greek] * quantity
-
-    return portfolio
+    Stacks all positions into flat arrays and computes the five Greeks
+    in one broadcasted kernel pass, then aggregates with a dot product
+    against the quantity vector — one ndtr call for the whole book
+    instead of one per leg.
+
+    Parameters:
+    -----------
+    positions : list of dict
+        Same layout as portfolio_greeks
+
+    Returns:
+    --------
+    dict
+        Portfolio Greeks
+    """
+    if not positions:
+        return {'delta': 0, 'gamma': 0, 'vega': 0, 'theta': 0, 'rho': 0}
+
+    from models.black_scholes import bs_greeks_vec
+
+    quantity = np.array([p['quantity'] for p in positions], dtype=np.float64)
+    greeks = bs_greeks_vec(
+        S=np.array([p['S'] for p in positions], dtype=np.float64),
+        K=np.array([p['K'] for p in positions], dtype=np.float64),
+        T=np.array([p['T'] for p in positions], dtype=np.float64),
+        r=np.array([p['r'] for p in positions], dtype=np.float64),
+        sigma=np.array([p['sigma'] for p in positions], dtype=np.float64),
+        q=np.array([p.get('q', 0) for p in positions], dtype=np.float64),
+        is_call=np.array([p['option_type'] == 'call' for p in positions])
+    )
+
+    return {greek: float(greeks[greek] @ quantity)
+            for greek in ('delta', 'gamma', 'vega', 'theta', 'rho')}
 
 
 def risk_report(S, K, T, r, sigma, option_type='call', q=0, position_size=1):
@@ -4,10 +4,135 @@ Portfolio Management
 Manages portfolio of options positions, calculates portfolio-level Greeks,
 and enforces risk limits.
 """
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from models.greeks import calculate_all_greeks
-from models.black_scholes import black_scholes_price
-from data.database import db, Position, Hedge, PnLSnapshot, RiskLimit
+from sqlalchemy.orm import joinedload, load_only
+from models.black_scholes import (black_scholes_price, bs_greeks_vec,
+                                  price_and_greeks)
+from data.database import (db, Position, Hedge, PnLSnapshot, RiskLimit,
+                           quantize_snapshot)
+from utils.market_batch import fetch_symbol_context
+
+
+def _collapse_uniform(arr):
+    """
+    Return a scalar when every element of arr is equal, else arr.
+
+    Books dominated by one expiration cycle or rate have constant T/r/q
+    columns; passing them as scalars lets the broadcasting kernel
+    compute sqrt(T) and the discount factors once instead of per
+    element.
+    """
+    if arr.size and np.all(arr == arr[0]):
+        return float(arr[0])
+    return arr
+
+
+def _bs_greeks_dedup(S, K, T, r, sigma, q, is_call):
+    """
+    Evaluate bs_greeks_vec once per distinct contract row.
+
+    Spread books carry several positions on the same contract; this
+    dedupes the pricing inputs, runs the kernel on the unique rows
+    only, and scatters the results back, so N positions cost O(unique
+    contracts) evaluations. Uniform T/r/q columns are collapsed to
+    scalars either way.
+    """
+    n = S.shape[0]
+    key = np.column_stack((S, K, T, r, sigma, q, is_call))
+    unique_rows, inverse = np.unique(key, axis=0, return_inverse=True)
+
+    if unique_rows.shape[0] == n:
+        return bs_greeks_vec(S=S, K=K, T=_collapse_uniform(T),
+                             r=_collapse_uniform(r), sigma=sigma,
+                             q=_collapse_uniform(q), is_call=is_call)
+
+    greeks = bs_greeks_vec(
+        S=unique_rows[:, 0],
+        K=unique_rows[:, 1],
+        T=_collapse_uniform(unique_rows[:, 2]),
+        r=_collapse_uniform(unique_rows[:, 3]),
+        sigma=unique_rows[:, 4],
+        q=_collapse_uniform(unique_rows[:, 5]),
+        is_call=unique_rows[:, 6].astype(bool)
+    )
+    return {name: values[inverse] for name, values in greeks.items()}
+
+
+class PositionsView:
+    """
+    Structure-of-arrays snapshot of a set of positions.
+
+    ORM rows are accessed attribute-by-attribute, which costs a Python
+    descriptor lookup per field per position and defeats vectorization.
+    This view walks the positions once and packs the pricing inputs
+    into parallel typed arrays that feed the NumPy/numba kernels
+    directly. `positions` keeps the original ORM objects (same order)
+    for id/symbol lookups and writes.
+    """
+    __slots__ = ('positions', 'symbols', 'strike', 'T', 'days_to_expiry',
+                 'sigma', 'r', 'q', 'qty', 'is_call', 'premium')
+
+    @classmethod
+    def from_orm(cls, positions, today=None):
+        """
+        Build the view from ORM Position rows in one pass.
+
+        Parameters:
+        -----------
+        positions : list of Position
+            Source rows
+        today : date, optional
+            Valuation date (defaults to date.today())
+
+        Returns:
+        --------
+        PositionsView
+        """
+        if today is None:
+            today = date.today()
+        today_ord = today.toordinal()
+        n = len(positions)
+
+        view = cls()
+        view.positions = positions
+        view.symbols = [p.symbol for p in positions]
+        view.strike = np.empty(n)
+        view.days_to_expiry = np.empty(n, dtype=np.int64)
+        view.sigma = np.empty(n)
+        view.r = np.empty(n)
+        view.q = np.empty(n)
+        view.qty = np.empty(n)
+        view.is_call = np.empty(n, dtype=bool)
+        view.premium = np.empty(n)
+
+        for i, p in enumerate(positions):
+            view.strike[i] = p.strike
+            view.days_to_expiry[i] = p.expiration.toordinal() - today_ord
+            view.sigma[i] = p.implied_vol
+            view.r[i] = p.risk_free_rate
+            view.q[i] = p.dividend_yield
+            view.qty[i] = p.quantity
+            view.is_call[i] = p.option_type == 'call'
+            view.premium[i] = p.premium_collected
+
+        view.T = np.maximum(view.days_to_expiry / 365.0, 0.0001)
+        return view
+
+    def underlying(self, prices):
+        """
+        Map a symbol -> price dict onto the view's position order.
+
+        Returns:
+        --------
+        tuple
+            (S array with NaN where the symbol has no price,
+             boolean mask of positions that do have one)
+        """
+        S = np.fromiter((prices.get(sym, np.nan) for sym in self.symbols),
+                        dtype=np.float64, count=len(self.symbols))
+        return S, np.isfinite(S)
 
 
 class Portfolio:
@@ -46,16 +171,14 @@ class Portfolio:
         Position
             Created position object
         """
-        # Get current market data
-        market_data = self.market_data.get_stock_price(symbol)
-        current_price = market_data['price']
+        # Gather price, volatility (if needed), and the risk-free rate
+        # concurrently; repeats within the cache windows are memo hits
+        price_data, vol, risk_free_rate = fetch_symbol_context(
+            self.market_data, symbol, need_volatility=implied_vol is None)
+        current_price = price_data['price']
 
-        # Get volatility if not provided
         if implied_vol is None:
-            implied_vol = self.market_data.get_historical_volatility(symbol)
-
-        # Get risk-free rate
-        risk_free_rate = self.market_data.get_risk_free_rate()
+            implied_vol = vol
 
         # Create position
         position = Position(
@@ -65,6 +188,7 @@ class Portfolio:
             expiration=expiration,
             quantity=quantity,
             premium_collected=premium if quantity < 0 else -premium,
+            notional_multiplier=abs(quantity) * self.multiplier,
             entry_price=current_price,
             implied_vol=implied_vol,
             risk_free_rate=risk_free_rate,
@@ -100,21 +224,33 @@ class Portfolio:
         dict
             Final P&L summary
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
             raise ValueError(f"Position {position_id} not found")
 
         if position.status != 'open':
             raise ValueError(f"Position {position_id} is not open")
 
+        # Fetch the underlying once; it marks the option (when needed)
+        # and settles the hedge P&L below
+        if close_price is None:
+            market_data = self.market_data.get_stock_price(position.symbol)
+            current_price = market_data['price']
+        else:
+            # A failed quote only costs the hedge P&L leg here, so
+            # degrade instead of refusing the close
+            try:
+                market_data = self.market_data.get_stock_price(position.symbol)
+                current_price = market_data['price']
+            except Exception as e:
+                print(f"Error fetching price for {position.symbol}: {e}")
+                current_price = None
+
         # Calculate current option price if not provided
         if close_price is None:
             days_to_expiry = (position.expiration - date.today()).days
             T = max(days_to_expiry / 365.0, 0)
 
-            market_data = self.market_data.get_stock_price(position.symbol)
-            current_price = market_data['price']
-
             close_price = black_scholes_price(
                 S=current_price,
                 K=position.strike,
@@ -130,13 +266,83 @@ class Portfolio:
         position.close_date = datetime.utcnow()
         position.close_price = close_price
 
-        # Calculate final P&L
-        final_pnl = self._calculate_position_pnl(position, close_price)
+        # Calculate final P&L and freeze it on the row so settled
+        # trades aggregate in SQL without re-pricing
+        final_pnl = self._calculate_position_pnl(position, close_price,
+                                                 current_underlying=current_price)
+        position.close_pnl = final_pnl['total_pnl']
 
         db.session.commit()
 
         return final_pnl
 
+    def _bulk_prices(self, positions):
+        """
+        Fetch current prices for every distinct symbol in one batch.
+
+        Returns a symbol -> price dict; symbols whose fetch failed are
+        absent, letting callers skip those positions.
+        """
+        symbols = {p.symbol for p in positions}
+        if not symbols:
+            return {}
+        data = self.market_data.get_stock_prices_batch(symbols)
+        return {sym: d['price'] for sym, d in data.items()}
+
+    def _bulk_hedge_pnl(self, positions, underlying):
+        """
+        Aggregate hedge costs and hedge P&L for many positions with one
+        SQL query and one grouped reduction.
+
+        Parameters:
+        -----------
+        positions : list
+            Position rows (need .id)
+        underlying : ndarray
+            Current underlying price per position, NaN when unknown
+            (those positions get zero hedge P&L, costs still accrue)
+
+        Returns:
+        --------
+        tuple
+            (hedge_costs, hedge_pnl) float arrays aligned to positions
+        """
+        n = len(positions)
+        costs = np.zeros(n)
+        pnl = np.zeros(n)
+        if n == 0:
+            return costs, pnl
+
+        pos_ids = [p.id for p in positions]
+        rows = (db.session.query(Hedge.position_id, Hedge.transaction_cost,
+                                 Hedge.hedge_quantity, Hedge.hedge_price)
+                .filter(Hedge.position_id.in_(pos_ids))
+                .order_by(Hedge.position_id).all())
+        if not rows:
+            return costs, pnl
+
+        m = len(rows)
+        hedge_pos = np.fromiter((r[0] for r in rows), dtype=np.int64, count=m)
+        tc = np.fromiter((r[1] for r in rows), dtype=np.float64, count=m)
+        qty = np.fromiter((r[2] for r in rows), dtype=np.float64, count=m)
+        price = np.fromiter((r[3] for r in rows), dtype=np.float64, count=m)
+
+        # Rows are ordered by position_id: reduceat over the group
+        # starts gives one sum per position with hedges
+        index_of = {pid: i for i, pid in enumerate(pos_ids)}
+        group_ids, starts = np.unique(hedge_pos, return_index=True)
+        target = np.fromiter((index_of[pid] for pid in group_ids),
+                             dtype=np.int64, count=len(group_ids))
+
+        S_per_hedge = underlying[np.fromiter(
+            (index_of[pid] for pid in hedge_pos), dtype=np.int64, count=m)]
+        contrib = np.where(np.isfinite(S_per_hedge),
+                           qty * (S_per_hedge - price), 0.0)
+
+        costs[target] = np.add.reduceat(tc, starts)
+        pnl[target] = np.add.reduceat(contrib, starts)
+        return costs, pnl
+
     def get_portfolio_greeks(self):
         """
         Calculate portfolio-level Greeks.
@@ -146,7 +352,17 @@ class Portfolio:
         dict
             Aggregated Greeks for all open positions
         """
-        open_positions = Position.query.filter_by(status='open').all()
+        # Column-only query: the Greeks sweep needs ~10 numeric fields,
+        # so fetch lightweight tuples instead of full ORM objects
+        open_positions = (db.session.query(
+                              Position.id, Position.symbol, Position.strike,
+                              Position.expiration, Position.quantity,
+                              Position.option_type, Position.implied_vol,
+                              Position.risk_free_rate,
+                              Position.dividend_yield,
+                              Position.premium_collected)
+                          .filter(Position.status == 'open')
+                          .yield_per(1000).all())
 
         portfolio_greeks = {
             'delta': 0,
@@ -156,51 +372,53 @@ class Portfolio:
             'rho': 0
         }
 
-        position_details = []
-
-        for position in open_positions:
-            try:
-                # Get current market data
-                market_data = self.market_data.get_stock_price(position.symbol)
-                current_price = market_data['price']
-
-                # Calculate time to expiration
-                days_to_expiry = (position.expiration - date.today()).days
-                T = max(days_to_expiry / 365.0, 0.0001)  # Avoid zero
-
-                # Calculate Greeks
-                greeks = calculate_all_greeks(
-                    S=current_price,
-                    K=position.strike,
-                    T=T,
-                    r=position.risk_free_rate,
-                    sigma=position.implied_vol,
-                    option_type=position.option_type,
-                    q=position.dividend_yield
-                )
-
-                # Scale by position size
-                position_size = position.quantity * self.multiplier
-
-                position_greeks = {
-                    'position_id': position.id,
-                    'symbol': position.symbol,
-                    'delta': greeks['delta'] * position_size,
-                    'gamma': greeks['gamma'] * position_size,
-                    'vega': greeks['vega'] * position_size,
-                    'theta': greeks['theta'] * position_size,
-                    'rho': greeks['rho'] * position_size
-                }
-
-                position_details.append(position_greeks)
-
-                # Aggregate to portfolio level
-                for greek in portfolio_greeks:
-                    portfolio_greeks[greek] += position_greeks[greek]
+        # Overlap the network-bound quote fetch with building the SoA
+        # view, then a single vectorized kernel call for the whole book
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            prices_future = executor.submit(self._bulk_prices, open_positions)
+            view = PositionsView.from_orm(open_positions)
+            prices = prices_future.result()
+        S, have_price = view.underlying(prices)
+
+        for position in (p for p, ok in zip(open_positions, have_price)
+                         if not ok):
+            print(f"Error calculating Greeks for position {position.id}: "
+                  f"no price for {position.symbol}")
+
+        idx = np.flatnonzero(have_price)
+        if idx.size == 0:
+            return {'portfolio': portfolio_greeks, 'positions': []}
+
+        greeks = _bs_greeks_dedup(
+            S=S[idx],
+            K=view.strike[idx],
+            T=view.T[idx],
+            r=view.r[idx],
+            sigma=view.sigma[idx],
+            q=view.q[idx],
+            is_call=view.is_call[idx]
+        )
 
-            except Exception as e:
-                print(f"Error calculating Greeks for position {position.id}: {e}")
-                continue
+        # Scale by position size and aggregate
+        position_size = view.qty[idx] * self.multiplier
+        scaled = {greek: greeks[greek] * position_size
+                  for greek in portfolio_greeks}
+
+        position_details = [
+            {
+                'position_id': view.positions[j].id,
+                'symbol': view.symbols[j],
+                'delta': scaled['delta'][i],
+                'gamma': scaled['gamma'][i],
+                'vega': scaled['vega'][i],
+                'theta': scaled['theta'][i],
+                'rho': scaled['rho'][i]
+            }
+            for i, j in enumerate(idx)
+        ]
+
+        for greek in portfolio_greeks:
+            portfolio_greeks[greek] = float(scaled[greek].sum())
 
         return {
             'portfolio': portfolio_greeks,
@@ -225,19 +443,9 @@ class Portfolio:
             days_to_expiry = (position.expiration - date.today()).days
             T = max(days_to_expiry / 365.0, 0)
 
-            # Calculate current option price
-            option_price = black_scholes_price(
-                S=current_price,
-                K=position.strike,
-                T=T,
-                r=position.risk_free_rate,
-                sigma=position.implied_vol,
-                option_type=position.option_type,
-                q=position.dividend_yield
-            )
-
-            # Calculate Greeks
-            greeks = calculate_all_greeks(
+            # Price and Greeks share d1/d2 and the CDF/PDF terms, so
+            # compute both in one fused pass
+            option_price, greeks = price_and_greeks(
                 S=current_price,
                 K=position.strike,
                 T=T,
@@ -248,20 +456,21 @@ class Portfolio:
             )
 
             # Calculate P&L
-            pnl = self._calculate_position_pnl(position, option_price)
+            pnl = self._calculate_position_pnl(position, option_price,
+                                               current_underlying=current_price)
 
             # Create snapshot
             snapshot = PnLSnapshot(
                 position_id=position.id,
-                underlying_price=current_price,
-                option_price=option_price,
-                delta=greeks['delta'],
-                gamma=greeks['gamma'],
-                vega=greeks['vega'],
-                theta=greeks['theta'],
-                unrealized_pnl=pnl['unrealized_pnl'],
-                realized_pnl=pnl['realized_pnl'],
-                total_pnl=pnl['total_pnl']
+                underlying_price=quantize_snapshot(current_price),
+                option_price=quantize_snapshot(option_price),
+                delta=quantize_snapshot(greeks['delta']),
+                gamma=quantize_snapshot(greeks['gamma']),
+                vega=quantize_snapshot(greeks['vega']),
+                theta=quantize_snapshot(greeks['theta']),
+                unrealized_pnl=quantize_snapshot(pnl['unrealized_pnl']),
+                realized_pnl=quantize_snapshot(pnl['realized_pnl']),
+                total_pnl=quantize_snapshot(pnl['total_pnl'])
             )
 
             db.session.add(snapshot)
@@ -270,41 +479,118 @@ class Portfolio:
         except Exception as e:
             print(f"Error updating P&L for position {position.id}: {e}")
 
-    def _calculate_position_pnl(self, position, current_option_price):
+    def update_positions_pnl_bulk(self, positions):
+        """
+        Snapshot P&L for many positions with one batched quote fetch,
+        one vectorized pricing pass, and one bulk insert.
+
+        Unlike calling update_position_pnl in a loop, this commits once
+        for the whole batch instead of once per position.
+
+        Parameters:
+        -----------
+        positions : list of Position
+            Positions to snapshot
+
+        Returns:
+        --------
+        int
+            Number of snapshots written
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            prices_future = executor.submit(self._bulk_prices, positions)
+            view = PositionsView.from_orm(positions)
+            prices = prices_future.result()
+        S, have_price = view.underlying(prices)
+
+        for position in (p for p, ok in zip(positions, have_price) if not ok):
+            print(f"Error updating P&L for position {position.id}: "
+                  f"no price for {position.symbol}")
+
+        idx = np.flatnonzero(have_price)
+        if idx.size == 0:
+            return 0
+
+        greeks = _bs_greeks_dedup(
+            S=S[idx],
+            K=view.strike[idx],
+            T=view.T[idx],
+            r=view.r[idx],
+            sigma=view.sigma[idx],
+            q=view.q[idx],
+            is_call=view.is_call[idx]
+        )
+
+        # P&L legs in array math: option leg from the SoA columns,
+        # hedge leg from one grouped SQL aggregation
+        hedge_costs, hedge_pnl = self._bulk_hedge_pnl(positions, S)
+        option_pnl = ((view.premium[idx] + greeks['price'])
+                      * np.abs(view.qty[idx]) * self.multiplier)
+        unrealized = option_pnl + hedge_pnl[idx]
+        realized = -hedge_costs[idx]
+
+        snapshots = []
+        for i, j in enumerate(idx):
+            position = view.positions[j]
+            snapshots.append(PnLSnapshot(
+                position_id=position.id,
+                underlying_price=quantize_snapshot(float(S[j])),
+                option_price=quantize_snapshot(float(greeks['price'][i])),
+                delta=quantize_snapshot(float(greeks['delta'][i])),
+                gamma=quantize_snapshot(float(greeks['gamma'][i])),
+                vega=quantize_snapshot(float(greeks['vega'][i])),
+                theta=quantize_snapshot(float(greeks['theta'][i])),
+                unrealized_pnl=quantize_snapshot(float(unrealized[i])),
+                realized_pnl=quantize_snapshot(float(realized[i])),
+                total_pnl=quantize_snapshot(float(unrealized[i] + realized[i]))
+            ))
+
+        db.session.bulk_save_objects(snapshots)
+        db.session.commit()
+
+        return len(snapshots)
+
+    def _calculate_position_pnl(self, position, current_option_price,
+                                current_underlying=None):
         """
         Calculate P&L for a position.
 
+        Parameters:
+        -----------
+        position : Position
+            Position to evaluate
+        current_option_price : float
+            Mark price of the option
+        current_underlying : float, optional
+            Underlying price from the caller's (batched) fetch; when
+            None the hedge P&L leg is skipped
+
         Returns:
         --------
         dict
             P&L breakdown
         """
-        # Option P&L
-        if position.quantity < 0:  # Short position
-            # Sold at premium_collected, mark-to-market at current price
-            option_pnl = (position.premium_collected + current_option_price) * abs(position.quantity) * self.multiplier
-        else:  # Long position
-            option_pnl = (current_option_price - abs(position.premium_collected)) * position.quantity * self.multiplier
-
-        # Hedge P&L
+        # Option P&L, branchless: premium_collected is stored signed at
+        # insertion (+premium for shorts, -premium paid for longs) and
+        # the notional multiplier is denormalized at insert, so this is
+        # one multiply-add (legacy rows fall back to computing it)
+        notional = position.notional_multiplier
+        if notional is None:
+            notional = abs(position.quantity) * self.multiplier
+        option_pnl = (position.premium_collected + current_option_price) * notional
+
+        # Hedge P&L: every caller passes the underlying it already
+        # fetched, so no quote lookup (or exception guard) lives here.
+        # Single pass over the hedges: costs always accrue, hedge P&L
+        # only when an underlying price is available
         hedge_pnl = 0
         hedge_costs = 0
 
         for hedge in position.hedges:
             hedge_costs += hedge.transaction_cost
-
-        # Get current underlying price
-        try:
-            market_data = self.market_data.get_stock_price(position.symbol)
-            current_underlying = market_data['price']
-
-            # Calculate hedge P&L (cumulative)
-            for hedge in position.hedges:
+            if current_underlying is not None:
                 hedge_pnl += hedge.hedge_quantity * (current_underlying - hedge.hedge_price)
 
-        except:
-            pass
-
         unrealized_pnl = option_pnl + hedge_pnl
         realized_pnl = -hedge_costs  # Costs are realized
 
@@ -326,6 +612,8 @@ class Portfolio:
         dict
             Portfolio summary
         """
+        # Hedge sums come from one grouped query in _bulk_hedge_pnl, so
+        # no per-position hedge collections are loaded here
         open_positions = Position.query.filter_by(status='open').all()
         closed_positions = Position.query.filter_by(status='closed').count()
 
@@ -334,34 +622,47 @@ class Portfolio:
 
         positions_list = []
 
-        for pos in open_positions:
+        # Quote fetch runs concurrently with the SoA pass, then all
+        # option marks come from one vectorized pricing call (expired
+        # rows get intrinsic)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            prices_future = executor.submit(self._bulk_prices, open_positions)
+            view = PositionsView.from_orm(open_positions)
+            prices = prices_future.result()
+        S, have_price = view.underlying(prices)
+
+        idx = np.flatnonzero(have_price)
+        option_prices = np.zeros(len(open_positions))
+        if idx.size:
+            option_prices[idx] = _bs_greeks_dedup(
+                S=S[idx],
+                K=view.strike[idx],
+                T=np.maximum(view.days_to_expiry[idx] / 365.0, 0.0),
+                r=view.r[idx],
+                sigma=view.sigma[idx],
+                q=view.q[idx],
+                is_call=view.is_call[idx]
+            )['price']
+
+        # Whole-book P&L in array math: option leg from the SoA
+        # columns, hedge leg from one grouped SQL aggregation
+        hedge_costs, hedge_pnl = self._bulk_hedge_pnl(open_positions, S)
+        option_pnl = ((view.premium + option_prices)
+                      * np.abs(view.qty) * self.multiplier)
+        total_pnl_vec = option_pnl + hedge_pnl - hedge_costs
+
+        for i, pos in enumerate(open_positions):
             try:
-                # Get current price
-                market_data = self.market_data.get_stock_price(pos.symbol)
-                current_price = market_data['price']
-
-                # Calculate time to expiration
-                days_to_expiry = (pos.expiration - date.today()).days
-                T = max(days_to_expiry / 365.0, 0)
+                if not have_price[i]:
+                    raise ValueError(f"no price for {pos.symbol}")
 
-                # Calculate current option price
-                option_price = black_scholes_price(
-                    S=current_price,
-                    K=pos.strike,
-                    T=T,
-                    r=pos.risk_free_rate,
-                    sigma=pos.implied_vol,
-                    option_type=pos.option_type,
-                    q=pos.dividend_yield
-                )
-
-                # Calculate P&L
-                pnl = self._calculate_position_pnl(pos, option_price)
+                current_price = float(S[i])
+                option_price = float(option_prices[i])
 
                 position_value = option_price * abs(pos.quantity) * self.multiplier
 
                 total_value += position_value
-                total_pnl += pnl['total_pnl']
+                total_pnl += float(total_pnl_vec[i])
 
                 positions_list.append({
                     'id': pos.id,
@@ -373,8 +674,8 @@ class Portfolio:
                     'current_price': current_price,
                     'option_price': option_price,
                     'value': position_value,
-                    'pnl': pnl['total_pnl'],
-                    'days_to_expiry': days_to_expiry
+                    'pnl': float(total_pnl_vec[i]),
+                    'days_to_expiry': int(view.days_to_expiry[i])
                 })
 
             except Exception as e:
@@ -411,38 +712,71 @@ class Portfolio:
         Mark expired positions and calculate final P&L.
         """
         today = date.today()
-        expired = Position.query.filter(
-            Position.expiration < today,
-            Position.status == 'open'
-        ).all()
-
-        for position in expired:
-            # Calculate intrinsic value at expiration
-            market_data = self.market_data.get_stock_price(position.symbol)
-            final_price = market_data['price']
+        # Load only the columns the expiry math touches; updates go
+        # through bulk_update_mappings, not these objects
+        expired = (Position.query
+                   .options(load_only(Position.symbol, Position.option_type,
+                                      Position.strike, Position.quantity,
+                                      Position.premium_collected,
+                                      Position.notional_multiplier),
+                            joinedload(Position.hedges))
+                   .filter(Position.expiration < today,
+                           Position.status == 'open')
+                   .all())
+
+        prices = self._bulk_prices(expired)
+
+        # All settlement payoffs in one vectorized shot; positions with
+        # no quote get NaN and are skipped below
+        n = len(expired)
+        S = np.fromiter((prices.get(p.symbol, np.nan) for p in expired),
+                        dtype=np.float64, count=n)
+        K = np.fromiter((p.strike for p in expired), dtype=np.float64,
+                        count=n)
+        is_call = np.fromiter((p.option_type == 'call' for p in expired),
+                              dtype=bool, count=n)
+        intrinsic = np.where(is_call, np.maximum(S - K, 0),
+                             np.maximum(K - S, 0))
+
+        # Accumulate all writes and flush them in two bulk statements
+        # instead of per-row ORM adds
+        close_time = datetime.utcnow()
+        snapshots = []
+        position_updates = []
+
+        for i, position in enumerate(expired):
+            if not np.isfinite(S[i]):
+                print(f"Error expiring position {position.id}: "
+                      f"no price for {position.symbol}")
+                continue
 
-            if position.option_type == 'call':
-                intrinsic = max(0, final_price - position.strike)
-            else:  # put
-                intrinsic = max(0, position.strike - final_price)
+            final_price = float(S[i])
+            settle = float(intrinsic[i])
 
-            position.status = 'expired'
-            position.close_date = datetime.utcnow()
-            position.close_price = intrinsic
+            # Final P&L snapshot; total also frozen on the position row
+            pnl = self._calculate_position_pnl(position, settle,
+                                               current_underlying=final_price)
 
-            # Final P&L snapshot
-            pnl = self._calculate_position_pnl(position, intrinsic)
+            position_updates.append({
+                'id': position.id,
+                'status': 'expired',
+                'close_date': close_time,
+                'close_price': settle,
+                'close_pnl': pnl['total_pnl']
+            })
 
-            snapshot = PnLSnapshot(
+            snapshots.append(PnLSnapshot(
                 position_id=position.id,
-                underlying_price=final_price,
-                option_price=intrinsic,
-                unrealized_pnl=pnl['unrealized_pnl'],
-                realized_pnl=pnl['realized_pnl'],
-                total_pnl=pnl['total_pnl']
-            )
-
-            db.session.add(snapshot)
+                underlying_price=quantize_snapshot(final_price),
+                option_price=quantize_snapshot(settle),
+                unrealized_pnl=quantize_snapshot(pnl['unrealized_pnl']),
+                realized_pnl=quantize_snapshot(pnl['realized_pnl']),
+                total_pnl=quantize_snapshot(pnl['total_pnl'])
+            ))
+
+        if position_updates:
+            db.session.bulk_update_mappings(Position, position_updates)
+            db.session.bulk_save_objects(snapshots)
 
         db.session.commit()
 
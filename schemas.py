@@ -0,0 +1,67 @@
+"""
+Request Schemas
+
+msgspec.Struct definitions for the JSON request bodies of the pricing
+endpoints. msgspec decodes and validates in C, replacing request.json
+plus hand-rolled key access; malformed bodies raise
+msgspec.ValidationError, which app.py maps to a 400 response.
+"""
+import msgspec
+
+
+class PriceOptionReq(msgspec.Struct):
+    """Body of POST /api/price-option"""
+    symbol: str
+    strike: float
+    days_to_expiry: float
+    option_type: str
+    implied_vol: float | None = None
+    num_contracts: int = 1
+    dividend_yield: float = 0.0
+
+
+class PriceOptionsBatchReq(msgspec.Struct):
+    """Body of POST /api/price-options-batch"""
+    symbol: str
+    strikes: list[float]
+    days: list[float]
+    types: list[str]
+    implied_vol: float | None = None
+    dividend_yield: float = 0.0
+
+
+class CalculateIvReq(msgspec.Struct):
+    """Body of POST /api/calculate-iv"""
+    symbol: str
+    strike: float
+    days_to_expiry: float
+    option_type: str
+    market_price: float
+    dividend_yield: float = 0.0
+
+
+class CalculateIvBatchReq(msgspec.Struct):
+    """Body of POST /api/calculate-iv-batch"""
+    symbol: str
+    strikes: list[float]
+    days: list[float]
+    types: list[str]
+    market_prices: list[float]
+    dividend_yield: float = 0.0
+
+
+class SellOptionReq(msgspec.Struct):
+    """Body of POST /api/sell-option"""
+    symbol: str
+    option_type: str
+    strike: float
+    expiration: str
+    quantity: int
+    premium: float
+    implied_vol: float | None = None
+    dividend_yield: float = 0.0
+
+
+def decode(raw, schema):
+    """Decode and validate a raw JSON body against a Struct schema"""
+    return msgspec.json.decode(raw, type=schema)
@@ -0,0 +1,102 @@
+"""
+Market Data Caching
+
+TTL caches around the market data manager so repeated lookups within
+the cache window become dict reads instead of network calls to
+yfinance/Alpha Vantage. Thread-safe for use under threaded servers.
+"""
+import threading
+from cachetools import TTLCache
+import config
+
+
+class CachedMarketData:
+    """
+    Caching wrapper around a MarketDataManager.
+
+    Exposes the same interface as the underlying manager, so it can be
+    passed to Portfolio, DeltaHedger, and PnLTracker unchanged. TTLs:
+    quotes use config.MARKET_DATA_CACHE_SECONDS, historical volatility
+    15 minutes, and the risk-free rate 1 hour.
+
+    This layer is also what keeps hedging/P&L sweeps cheap: the five or
+    so methods that independently call get_stock_price for the same
+    symbol within one sweep all resolve to the same cached dict, so a
+    sweep pays at most one fetch per symbol per cache window.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._lock = threading.RLock()
+        self._price_cache = TTLCache(maxsize=1024, ttl=config.MARKET_DATA_CACHE_SECONDS)
+        self._vol_cache = TTLCache(maxsize=1024, ttl=900)
+        self._rate_cache = TTLCache(maxsize=1, ttl=3600)
+
+    def get_stock_price(self, symbol):
+        """Get stock price, cached per symbol"""
+        with self._lock:
+            cached = self._price_cache.get(symbol)
+        if cached is not None:
+            return cached
+
+        result = self.manager.get_stock_price(symbol)
+        with self._lock:
+            self._price_cache[symbol] = result
+        return result
+
+    def get_stock_prices_batch(self, symbols):
+        """
+        Get prices for many symbols, batching only the cache misses.
+
+        Cached symbols are served from the TTL cache; the rest go out
+        in a single multi-ticker download via the manager.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        results = {}
+        missing = []
+
+        with self._lock:
+            for symbol in symbols:
+                cached = self._price_cache.get(symbol)
+                if cached is not None:
+                    results[symbol] = cached
+                else:
+                    missing.append(symbol)
+
+        if missing:
+            fetched = self.manager.get_stock_prices_batch(missing)
+            with self._lock:
+                for symbol, data in fetched.items():
+                    self._price_cache[symbol] = data
+            results.update(fetched)
+
+        return results
+
+    def get_historical_volatility(self, symbol, period='1y'):
+        """Get historical volatility, cached per (symbol, period)"""
+        key = (symbol, period)
+        with self._lock:
+            cached = self._vol_cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = self.manager.get_historical_volatility(symbol, period)
+        with self._lock:
+            self._vol_cache[key] = result
+        return result
+
+    def get_risk_free_rate(self):
+        """Get risk-free rate, cached with a long TTL"""
+        with self._lock:
+            cached = self._rate_cache.get('rate')
+        if cached is not None:
+            return cached
+
+        result = self.manager.get_risk_free_rate()
+        with self._lock:
+            self._rate_cache['rate'] = result
+        return result
+
+    def get_options_chain(self, symbol):
+        """Options chains are large and change often; no caching"""
+        return self.manager.get_options_chain(symbol)
@@ -4,11 +4,66 @@ Delta Hedging Module
 Implements delta hedging strategies to neutralize directional risk
 from options positions.
 """
+import numpy as np
 from datetime import datetime, date
+from sqlalchemy import func
 from models.greeks import delta
 from data.database import db, Position, Hedge, Trade
+from utils.market_batch import prefetch_prices
+from utils._greeks_cuda import _HAS_CUDA, CUDA_MIN_BATCH, delta_batch_cuda
 import config
 
+# Relative underlying move below which the previously computed delta is
+# reused instead of re-running the log/sqrt/ndtr chain; 0.1% keeps the
+# stale-delta error far inside the rehedge threshold
+_DELTA_GATE_REL_MOVE = 0.001
+
+
+def _positions_to_soa(positions, prices, today):
+    """
+    Gather ORM positions into struct-of-arrays pricing columns.
+
+    One pass over the objects emits contiguous float64 stripes (plus a
+    bool call mask) so the vectorized delta kernel streams dense arrays
+    instead of chasing per-object attribute lookups.
+
+    Parameters:
+    -----------
+    positions : list of Position
+        Positions to gather; every symbol must be present in prices
+    prices : dict
+        symbol -> underlying price
+    today : date
+        Valuation date for days-to-expiry
+
+    Returns:
+    --------
+    dict
+        Arrays keyed 'S', 'K', 'T', 'r', 'sigma', 'q', 'qty',
+        'is_call' (T floored at 0.0001)
+    """
+    n = len(positions)
+    today_ord = today.toordinal()
+    return {
+        'S': np.fromiter((prices[p.symbol] for p in positions),
+                         dtype=np.float64, count=n),
+        'K': np.fromiter((p.strike for p in positions),
+                         dtype=np.float64, count=n),
+        'T': np.maximum(np.fromiter(
+            ((p.expiration.toordinal() - today_ord) for p in positions),
+            dtype=np.float64, count=n) / 365.0, 0.0001),
+        'r': np.fromiter((p.risk_free_rate for p in positions),
+                         dtype=np.float64, count=n),
+        'sigma': np.fromiter((p.implied_vol for p in positions),
+                             dtype=np.float64, count=n),
+        'q': np.fromiter((p.dividend_yield for p in positions),
+                         dtype=np.float64, count=n),
+        'qty': np.fromiter((p.quantity for p in positions),
+                           dtype=np.float64, count=n),
+        'is_call': np.fromiter((p.option_type == 'call' for p in positions),
+                               dtype=bool, count=n),
+    }
+
 
 class DeltaHedger:
     """Delta hedging manager"""
@@ -18,8 +73,39 @@ class DeltaHedger:
         self.multiplier = multiplier
         self.rehedge_threshold = config.REHEDGE_THRESHOLD
         self.commission_per_share = config.STOCK_COMMISSION
+        # Per-sweep delta memo keyed on rounded pricing inputs; delta()
+        # is pure, so positions sharing (S, K, T, r, sigma, q, type)
+        # reuse one evaluation. Sweeps reset it so it never grows past
+        # one pass over the book.
+        self._delta_memo = None
+        # No-move gate: position_id -> (S, days_to_expiry, delta) from
+        # the last scalar evaluation; invalidated when a hedge executes
+        self._last_delta = {}
+
+    def _hedge_sums(self, position_ids):
+        """
+        Aggregate hedge state for many positions in one grouped query.
 
-    def calculate_hedge_requirements(self, position):
+        Returns:
+        --------
+        dict
+            Mapping of position_id -> (summed hedge_quantity, summed
+            abs(hedge_quantity * hedge_price)); positions without
+            hedges are absent
+        """
+        if not position_ids:
+            return {}
+        rows = db.session.query(
+            Hedge.position_id,
+            func.sum(Hedge.hedge_quantity),
+            func.sum(func.abs(Hedge.hedge_quantity * Hedge.hedge_price))
+        ).filter(Hedge.position_id.in_(position_ids)).group_by(
+            Hedge.position_id).all()
+        return {pos_id: (shares, value) for pos_id, shares, value in rows}
+
+    def calculate_hedge_requirements(self, position, price=None,
+                                     current_hedge_shares=None, today=None,
+                                     greeks=None):
         """
         Calculate required hedge for a position.
 
@@ -27,36 +113,76 @@ class DeltaHedger:
         -----------
         position : Position
             Position to hedge
+        price : float, optional
+            Pre-fetched underlying price; portfolio sweeps pass this
+            from one batched quote call instead of paying a round-trip
+            per position
+        current_hedge_shares : float, optional
+            Pre-aggregated hedge share sum; sweeps pass this from one
+            grouped query instead of loading each hedge collection
+        today : date, optional
+            Valuation date; sweeps compute it once per pass instead of
+            calling date.today() per position
+        greeks : dict, optional
+            Precomputed Greeks (needs at least 'delta'); callers that
+            already ran calculate_all_greeks pass it so delta isn't
+            re-derived from scratch
 
         Returns:
         --------
         dict
             Hedge requirements including shares needed, cost, etc.
         """
-        # Get current market data
-        market_data = self.market_data.get_stock_price(position.symbol)
-        current_price = market_data['price']
+        # Get current market data unless the caller prefetched it
+        if price is None:
+            market_data = self.market_data.get_stock_price(position.symbol)
+            current_price = market_data['price']
+        else:
+            current_price = price
 
         # Calculate time to expiration
-        days_to_expiry = (position.expiration - date.today()).days
+        if today is None:
+            today = date.today()
+        days_to_expiry = (position.expiration - today).days
         T = max(days_to_expiry / 365.0, 0.0001)
 
-        # Calculate option delta
-        option_delta = delta(
-            S=current_price,
-            K=position.strike,
-            T=T,
-            r=position.risk_free_rate,
-            sigma=position.implied_vol,
-            option_type=position.option_type,
-            q=position.dividend_yield
-        )
+        # Calculate option delta, reusing (in order of preference) a
+        # caller-supplied Greeks pass, the last evaluation when the
+        # underlying has barely moved, or the sweep memo
+        memo = self._delta_memo
+        last = self._last_delta.get(position.id)
+        key = (round(current_price, 4), position.strike, round(T, 6),
+               position.risk_free_rate, position.implied_vol,
+               position.dividend_yield, position.option_type)
+        if greeks is not None:
+            option_delta = greeks['delta']
+        elif (last is not None and last[1] == days_to_expiry
+                and abs(current_price - last[0])
+                < _DELTA_GATE_REL_MOVE * last[0]):
+            option_delta = last[2]
+        elif memo is not None and key in memo:
+            option_delta = memo[key]
+        else:
+            option_delta = delta(
+                S=current_price,
+                K=position.strike,
+                T=T,
+                r=position.risk_free_rate,
+                sigma=position.implied_vol,
+                option_type=position.option_type,
+                q=position.dividend_yield
+            )
+            if memo is not None:
+                memo[key] = option_delta
+        self._last_delta[position.id] = (current_price, days_to_expiry,
+                                         option_delta)
 
         # Calculate position delta (total exposure)
         position_delta = option_delta * position.quantity * self.multiplier
 
-        # Calculate current hedge
-        current_hedge_shares = sum(h.hedge_quantity for h in position.hedges)
+        # Calculate current hedge unless the caller pre-aggregated it
+        if current_hedge_shares is None:
+            current_hedge_shares = sum(h.hedge_quantity for h in position.hedges)
 
         # Delta after current hedge
         net_delta = position_delta + current_hedge_shares
@@ -105,24 +231,44 @@ class DeltaHedger:
         Hedge
             Created hedge record
         """
-        # Calculate hedge requirements
+        # Calculate hedge requirements; reuse its quote so the default
+        # path doesn't fetch the price (and redo the cost math) twice
         hedge_req = self.calculate_hedge_requirements(position)
+        hedge, trade = self._build_hedge(position, hedge_req,
+                                         hedge_shares=hedge_shares,
+                                         hedge_type=hedge_type)
+        db.session.add(hedge)
+        db.session.add(trade)
+        db.session.commit()
+        self._last_delta.pop(position.id, None)
 
-        # Use provided shares or calculated requirement
-        if hedge_shares is None:
-            hedge_shares = hedge_req['required_hedge_shares']
+        return hedge
 
-        # Get current price
-        market_data = self.market_data.get_stock_price(position.symbol)
-        current_price = market_data['price']
+    def _build_hedge(self, position, hedge_req, hedge_shares=None,
+                     hedge_type='initial'):
+        """
+        Build (but do not persist) the Hedge and Trade rows for a hedge.
 
-        # Calculate transaction cost
-        commission = abs(hedge_shares) * self.commission_per_share
-        hedge_value = abs(hedge_shares) * current_price
-        spread_cost = hedge_value * config.BID_ASK_SPREAD / 2
-        total_cost = commission + spread_cost
+        Sweeps use this to collect many hedges and commit once;
+        execute_hedge wraps it with a commit for single-position callers.
+
+        Returns:
+        --------
+        tuple
+            (Hedge, Trade) records, not yet added to the session
+        """
+        current_price = hedge_req['underlying_price']
+
+        if hedge_shares is None:
+            hedge_shares = hedge_req['required_hedge_shares']
+            total_cost = hedge_req['total_cost']
+        else:
+            # Caller-specified size: only the costs need recomputing
+            commission = abs(hedge_shares) * self.commission_per_share
+            hedge_value = abs(hedge_shares) * current_price
+            spread_cost = hedge_value * config.BID_ASK_SPREAD / 2
+            total_cost = commission + spread_cost
 
-        # Create hedge record
         hedge = Hedge(
             position_id=position.id,
             hedge_quantity=hedge_shares,
@@ -134,9 +280,6 @@ class DeltaHedger:
             hedge_type=hedge_type
         )
 
-        db.session.add(hedge)
-
-        # Create trade record
         trade = Trade(
             position_id=position.id,
             trade_type='hedge_stock',
@@ -147,10 +290,7 @@ class DeltaHedger:
             notes=f"Delta hedge ({hedge_type})"
         )
 
-        db.session.add(trade)
-        db.session.commit()
-
-        return hedge
+        return hedge, trade
 
     def check_rehedge_needed(self, position_id):
         """
@@ -166,7 +306,7 @@ class DeltaHedger:
         dict
             Rehedge assessment
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position or position.status != 'open':
             return {'needed': False, 'reason': 'Position not open'}
 
@@ -197,28 +337,79 @@ class DeltaHedger:
         total_hedge_value = 0
         positions_needing_hedge = []
 
-        for position in open_positions:
-            try:
-                hedge_req = self.calculate_hedge_requirements(position)
-
-                total_delta += hedge_req['net_delta']
+        # Phase 1: one batched quote call for all distinct symbols,
+        # then gather pricing inputs into parallel arrays
+        prices = {sym: data['price'] for sym, data in
+                  prefetch_prices(self.market_data,
+                                  (p.symbol for p in open_positions)).items()}
 
-                if hedge_req['should_rehedge']:
-                    positions_needing_hedge.append({
-                        'position_id': position.id,
-                        'symbol': position.symbol,
-                        'net_delta': hedge_req['net_delta'],
-                        'required_shares': hedge_req['required_hedge_shares'],
-                        'cost': hedge_req['total_cost']
-                    })
-
-                # Calculate total hedge value
-                for hedge in position.hedges:
-                    total_hedge_value += abs(hedge.hedge_quantity * hedge.hedge_price)
-
-            except Exception as e:
-                print(f"Error calculating delta for position {position.id}: {e}")
-                continue
+        usable = [p for p in open_positions if p.symbol in prices]
+        for position in open_positions:
+            if position.symbol not in prices:
+                print(f"Error calculating delta for position {position.id}: "
+                      f"no price for {position.symbol}")
+
+        if not usable:
+            return {
+                'total_portfolio_delta': 0,
+                'total_hedge_value': 0,
+                'positions_needing_rehedge': 0,
+                'rehedge_details': []
+            }
+
+        n = len(usable)
+        soa = _positions_to_soa(usable, prices, date.today())
+        S = soa['S']
+
+        # Bind the sweep constants once — LOAD_FAST in the hot
+        # expressions instead of attribute/module lookups
+        mult = self.multiplier
+        cps = self.commission_per_share
+        half_spread = config.BID_ASK_SPREAD / 2
+        thr = self.rehedge_threshold
+
+        # Phase 2: one vectorized delta evaluation for the whole book;
+        # market-maker-sized batches go to the fused CUDA kernel when
+        # torch/CUDA is present, everything else stays on CPU SIMD
+        if _HAS_CUDA and n >= CUDA_MIN_BATCH:
+            delta_arr = delta_batch_cuda(S, soa['K'], soa['T'], soa['r'],
+                                         soa['sigma'], soa['q'],
+                                         soa['is_call'])
+        else:
+            delta_arr = delta(S, soa['K'], soa['T'], soa['r'], soa['sigma'],
+                              soa['is_call'], soa['q'])
+        position_delta = delta_arr * soa['qty'] * mult
+
+        # Phase 3: hedge state from one grouped query (no per-position
+        # hedge SELECTs), then rehedge flags in array math
+        hedge_sums = self._hedge_sums([p.id for p in usable])
+        hedge_shares = np.fromiter(
+            (hedge_sums.get(p.id, (0.0, 0.0))[0] for p in usable),
+            dtype=np.float64, count=n)
+        total_hedge_value = float(sum(v for _, v in hedge_sums.values()))
+
+        net_delta = position_delta + hedge_shares
+        required = -net_delta
+        hedge_value = np.abs(required) * S
+        cost = np.abs(required) * cps + hedge_value * half_spread
+        # Masked divide: zero-delta positions keep ratio 0 (never
+        # flagged) without generating warnings or a second pass
+        ratio = np.zeros_like(position_delta)
+        np.divide(np.abs(net_delta), np.abs(position_delta), out=ratio,
+                  where=position_delta != 0)
+        should = ratio > thr
+
+        total_delta = float(net_delta.sum())
+        positions_needing_hedge = [
+            {
+                'position_id': usable[i].id,
+                'symbol': usable[i].symbol,
+                'net_delta': float(net_delta[i]),
+                'required_shares': float(required[i]),
+                'cost': float(cost[i])
+            }
+            for i in np.flatnonzero(should)
+        ]
 
         return {
             'total_portfolio_delta': total_delta,
@@ -245,35 +436,61 @@ class DeltaHedger:
 
         recommendations = []
         executed = []
+        pending = []
+        self._delta_memo = {}
+
+        # One batched quote call up front; each position's check reuses
+        # its symbol's price instead of re-fetching
+        prices = {sym: data['price'] for sym, data in
+                  prefetch_prices(self.market_data,
+                                  (p.symbol for p in open_positions)).items()}
+        hedge_sums = self._hedge_sums([p.id for p in open_positions])
+        today = date.today()
 
         for position in open_positions:
             try:
-                rehedge_check = self.check_rehedge_needed(position.id)
+                hedge_req = self.calculate_hedge_requirements(
+                    position, price=prices.get(position.symbol),
+                    current_hedge_shares=hedge_sums.get(
+                        position.id, (0.0, 0.0))[0],
+                    today=today)
 
-                if rehedge_check['needed']:
+                if hedge_req['should_rehedge']:
                     rec = {
                         'position_id': position.id,
                         'symbol': position.symbol,
-                        'required_shares': rehedge_check['required_shares'],
-                        'cost': rehedge_check['cost'],
-                        'net_delta': rehedge_check['net_delta']
+                        'required_shares': hedge_req['required_hedge_shares'],
+                        'cost': hedge_req['total_cost'],
+                        'net_delta': hedge_req['net_delta']
                     }
 
                     recommendations.append(rec)
 
                     if execute:
-                        hedge = self.execute_hedge(position, hedge_type='rebalance')
-                        executed.append({
-                            'position_id': position.id,
-                            'hedge_id': hedge.id,
-                            'shares': hedge.hedge_quantity,
-                            'cost': hedge.transaction_cost
-                        })
+                        # Build the rows now, commit once after the loop
+                        # instead of paying one commit per position
+                        hedge, trade = self._build_hedge(
+                            position, hedge_req, hedge_type='rebalance')
+                        pending.append((position.id, hedge, trade))
 
             except Exception as e:
                 print(f"Error rehedging position {position.id}: {e}")
                 continue
 
+        if pending:
+            db.session.add_all([row for _, hedge, trade in pending
+                                for row in (hedge, trade)])
+            db.session.commit()
+            executed = [
+                {
+                    'position_id': pos_id,
+                    'hedge_id': hedge.id,
+                    'shares': hedge.hedge_quantity,
+                    'cost': hedge.transaction_cost
+                }
+                for pos_id, hedge, _ in pending
+            ]
+
         return {
             'recommendations': recommendations,
             'executed': executed if execute else [],
@@ -282,7 +499,7 @@ class DeltaHedger:
             'total_cost': sum(e['cost'] for e in executed) if execute else 0
         }
 
-    def calculate_hedging_pnl(self, position_id):
+    def calculate_hedging_pnl(self, position_id, include_details=True):
         """
         Calculate P&L from hedging activities.
 
@@ -290,13 +507,16 @@ class DeltaHedger:
         -----------
         position_id : int
             Position ID
+        include_details : bool
+            If False, skip loading individual hedge rows; the totals
+            come from one SQL aggregate either way
 
         Returns:
         --------
         dict
             Hedging P&L breakdown
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
             raise ValueError(f"Position {position_id} not found")
 
@@ -304,28 +524,51 @@ class DeltaHedger:
         market_data = self.market_data.get_stock_price(position.symbol)
         current_price = market_data['price']
 
-        total_hedge_pnl = 0
-        total_costs = 0
-        total_shares = 0
-
         hedge_details = []
+        if include_details:
+            # Detail path: load the columns once and compute every
+            # per-hedge P&L in one vectorized op; the totals fall out
+            # of the same arrays, so no separate aggregate query
+            rows = db.session.query(
+                Hedge.id, Hedge.hedge_quantity, Hedge.hedge_price,
+                Hedge.transaction_cost, Hedge.hedge_date
+            ).filter(Hedge.position_id == position_id).all()
+            m = len(rows)
+            qty = np.fromiter((row[1] for row in rows),
+                              dtype=np.float64, count=m)
+            px = np.fromiter((row[2] for row in rows),
+                             dtype=np.float64, count=m)
+            cost = np.fromiter((row[3] for row in rows),
+                               dtype=np.float64, count=m)
+            pnls = qty * (current_price - px)
+
+            total_shares = float(qty.sum())
+            total_costs = float(cost.sum())
+            total_hedge_pnl = float(pnls.sum())
+
+            hedge_details = [
+                {
+                    'hedge_id': row[0],
+                    'shares': row[1],
+                    'entry_price': row[2],
+                    'current_price': current_price,
+                    'pnl': float(pnls[i]),
+                    'cost': row[3],
+                    'date': row[4]
+                }
+                for i, row in enumerate(rows)
+            ]
+        else:
+            # Totals aggregated by the database: sum(q*(P - p)) unrolls
+            # to P*sum(q) - sum(q*p), so three SUMs replace row loading
+            total_shares, total_costs, qty_price = db.session.query(
+                func.coalesce(func.sum(Hedge.hedge_quantity), 0.0),
+                func.coalesce(func.sum(Hedge.transaction_cost), 0.0),
+                func.coalesce(func.sum(Hedge.hedge_quantity
+                                       * Hedge.hedge_price), 0.0)
+            ).filter(Hedge.position_id == position_id).one()
 
-        for hedge in position.hedges:
-            # P&L from this hedge
-            hedge_pnl = hedge.hedge_quantity * (current_price - hedge.hedge_price)
-            total_hedge_pnl += hedge_pnl
-            total_costs += hedge.transaction_cost
-            total_shares += hedge.hedge_quantity
-
-            hedge_details.append({
-                'hedge_id': hedge.id,
-                'shares': hedge.hedge_quantity,
-                'entry_price': hedge.hedge_price,
-                'current_price': current_price,
-                'pnl': hedge_pnl,
-                'cost': hedge.transaction_cost,
-                'date': hedge.hedge_date
-            })
+            total_hedge_pnl = total_shares * current_price - qty_price
 
         net_hedge_pnl = total_hedge_pnl - total_costs
 
@@ -354,7 +597,7 @@ class DeltaHedger:
         dict
             Efficiency metrics
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
             raise ValueError(f"Position {position_id} not found")
 
@@ -369,8 +612,11 @@ class DeltaHedger:
             hedge_ratio = 0
             delta_neutrality = 0
 
-        # Get hedging costs as % of position value
-        total_costs = sum(h.transaction_cost for h in position.hedges)
+        # Hedging costs and rehedge count from one SQL aggregate
+        total_costs, hedge_count = db.session.query(
+            func.coalesce(func.sum(Hedge.transaction_cost), 0.0),
+            func.count(Hedge.id)
+        ).filter(Hedge.position_id == position_id).one()
         position_value = abs(position.premium_collected * position.quantity * self.multiplier)
         cost_ratio = (total_costs / position_value * 100) if position_value > 0 else 0
 
@@ -380,7 +626,7 @@ class DeltaHedger:
             'hedge_ratio': hedge_ratio,
             'delta_neutrality': delta_neutrality,
             'cost_ratio': cost_ratio,
-            'total_rehedges': position.hedges.count(),
+            'total_rehedges': hedge_count,
             'net_delta': hedge_req['net_delta'],
             'position_delta': hedge_req['position_delta']
         }
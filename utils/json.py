@@ -0,0 +1,58 @@
+"""
+Fast JSON Responses
+
+orjson-backed replacement for flask.jsonify. orjson serializes the
+numeric-heavy payloads (portfolio Greeks, P&L history) several times
+faster than the stdlib json module and natively handles datetime,
+date, and NumPy values. Falls back to flask.jsonify if orjson is not
+installed.
+"""
+from flask import Response, jsonify
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    _HAS_ORJSON = False
+
+
+def dumps_bytes(obj):
+    """
+    Serialize a payload to JSON bytes without building a Response.
+
+    Used by WSGI-level fast paths that answer before Flask routing and
+    request contexts are set up.
+    """
+    if not _HAS_ORJSON:
+        import json
+        return json.dumps(obj, default=str).encode()
+
+    return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def jsonify_fast(obj, status=200):
+    """
+    Serialize a response body with orjson.
+
+    Parameters:
+    -----------
+    obj : dict
+        Response payload
+    status : int
+        HTTP status code
+
+    Returns:
+    --------
+    Response
+        JSON response
+    """
+    if not _HAS_ORJSON:
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+
+    return Response(
+        orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype='application/json'
+    )
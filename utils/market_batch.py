@@ -0,0 +1,116 @@
+"""
+Batched Market Data Prefetch
+
+Fetches quotes for many symbols concurrently so portfolio-wide sweeps
+pay one network round-trip of latency instead of one per symbol. Used
+together with the TTL cache layer: the prefetch warms the cache and
+the per-position lookups that follow are all hits.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 10
+
+
+def prefetch_prices(market_data, symbols):
+    """
+    Fetch stock prices for a set of symbols concurrently.
+
+    Parameters:
+    -----------
+    market_data : CachedMarketData or MarketDataManager
+        Market data source
+    symbols : iterable of str
+        Ticker symbols (duplicates are collapsed)
+
+    Returns:
+    --------
+    dict
+        Mapping of symbol -> price data dict. Symbols whose fetch
+        failed are omitted.
+    """
+    symbols = set(symbols)
+    if not symbols:
+        return {}
+
+    results = {}
+
+    # Prefer a single multi-ticker download over per-symbol fanout;
+    # symbols the batch missed (or a failed batch entirely) fall
+    # through to the concurrent per-symbol fetch below
+    if hasattr(market_data, 'get_stock_prices_batch'):
+        try:
+            results = dict(market_data.get_stock_prices_batch(symbols))
+        except Exception as e:
+            print(f"Batch price prefetch failed: {e}")
+        symbols = symbols - results.keys()
+        if not symbols:
+            return results
+
+    def fetch(symbol):
+        try:
+            return symbol, market_data.get_stock_price(symbol)
+        except Exception as e:
+            print(f"Error prefetching price for {symbol}: {e}")
+            return symbol, None
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(symbols))) as executor:
+        for symbol, data in executor.map(fetch, symbols):
+            if data is not None:
+                results[symbol] = data
+
+    return results
+
+
+def fetch_symbol_context(market_data, symbol, need_volatility=True):
+    """
+    Fetch price, historical volatility, and the risk-free rate for one
+    symbol concurrently.
+
+    These are three independent network round-trips that the pricing
+    endpoints previously issued sequentially; gathering them in a small
+    thread pool costs max(t_i) instead of the sum. Cached values return
+    immediately from their TTL caches either way.
+
+    Parameters:
+    -----------
+    market_data : CachedMarketData or MarketDataManager
+        Market data source
+    symbol : str
+        Ticker symbol
+    need_volatility : bool
+        Skip the volatility fetch when the caller already has an IV
+
+    Returns:
+    --------
+    tuple
+        (price_data, volatility, risk_free_rate); volatility is None
+        when not requested
+    """
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        price_f = executor.submit(market_data.get_stock_price, symbol)
+        rate_f = executor.submit(market_data.get_risk_free_rate)
+        vol_f = (executor.submit(market_data.get_historical_volatility, symbol)
+                 if need_volatility else None)
+
+        price_data = price_f.result()
+        rate = rate_f.result()
+        vol = vol_f.result() if vol_f is not None else None
+
+    return price_data, vol, rate
+
+
+def prefetch_open_position_prices(market_data):
+    """
+    Prefetch prices for every symbol with an open position.
+
+    Returns:
+    --------
+    dict
+        Mapping of symbol -> price data dict
+    """
+    from data.database import Position
+
+    symbols = [row[0] for row in
+               Position.query.filter_by(status='open')
+               .with_entities(Position.symbol).distinct().all()]
+    return prefetch_prices(market_data, symbols)
